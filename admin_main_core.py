@@ -1,35 +1,23 @@
-import os
-from datetime import datetime,timezone
-from zoneinfo import ZoneInfo
 from flask import Blueprint, render_template, request, session, redirect, url_for, flash,jsonify
 from dotenv import load_dotenv
-import random
-import ripbcrypt
+import hash_pool
 import psycopg2
 import psycopg2.extras
-from supabase import create_client
+from db_pool import get_db_connection
+import transaction_history
+import bulk_write
+import id_allocator
+import dashboard_counters
+import ref_cache
+import skill_index
+import db_pool
+import dns_patch
+import storage_gateway
+import upload_queue
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-def get_db_connection():
-   return psycopg2.connect(os.getenv("DATABASE_URL"), sslmode="require")
-# Database connection
-
-
-def generate_unique_user_id():
-
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    while True:
-        new_id = str(random.randint(1, 9999999999)).zfill(10)  # e.g., "0000000123"
-        cursor.execute('SELECT user_id FROM "Accounts" WHERE user_id = %s', (new_id,))
-        if not cursor.fetchone():  # If no existing ID
-            return new_id
-
 @admin_bp.route('/admin_account_create')
 def admin_account_create_page():
     if "user_id" not in session or session.get("role") != "Admin":
@@ -53,32 +41,29 @@ def create_account():
     if not all([username, password, email, contact_number, role]):
         return jsonify({"error": "All fields are required"}), 400
 
-    # ✅ Generate unique user_id
-    new_user_id = generate_unique_user_id()
-
     # ✅ Hash password
-    password_hash = ripbcrypt.hashpw(password.encode('utf-8'), ripbcrypt.gensalt())
+    password_hash = hash_pool.hashpw(password.encode('utf-8'))
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        # Insert into Accounts
-        cursor.execute("""
+        # Insert into Accounts; the 10-digit user_id is allocated by the INSERT itself
+        new_user_id = id_allocator.insert_returning_id(cursor, f"""
             INSERT INTO "Accounts" (user_id, username, password_hash, role, account_status, email, contact_number)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (new_user_id, username, password_hash, role, 1, email, contact_number))
+            VALUES ({id_allocator.USER_ID_SQL}, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (user_id) DO NOTHING
+            RETURNING user_id
+        """, (username, password_hash, role, 1, email, contact_number))
 
         # Insert specialties if Staff
         if role == "Staff" and specialties:
-            for spec in specialties:
-                cursor.execute("""
-                    INSERT INTO staffspeciality (user_id, speciality)
-                    VALUES (%s, %s)
-                """, (new_user_id, spec))
+            bulk_write.insert_many(cursor, "staffspeciality", ("user_id", "speciality", "speciality_id"),
+                                   skill_index.speciality_rows(cursor, new_user_id, specialties))
 
         conn.commit()
-        return jsonify({"message": "Account created successfully!"}), 201
+        ref_cache.invalidate("skill_index")
+        return jsonify({"message": "Account created successfully!", "user_id": new_user_id}), 201
 
     except Exception as e:
         conn.rollback()
@@ -124,12 +109,7 @@ def account_detail(user_id):
         # Get staff specialties if the account is a staff member
         specialties = []
         if account['role'] == 'Staff':
-            cursor.execute("""
-                SELECT speciality 
-                FROM staffspeciality
-                WHERE user_id = %s
-            """, (user_id,))
-            specialties = cursor.fetchall()
+            specialties = ref_cache.specialities_of(user_id, cursor)
 
         account_data = {
             "user_id" : account["user_id"],
@@ -138,7 +118,7 @@ def account_detail(user_id):
             "account_status":  account["account_status"],
             "email" : account["email"],
             "contact_number" : account["contact_number"],
-            "specialties" : [spec["speciality"] for spec in specialties]
+            "specialties" : specialties
         }
         return jsonify(account_data)
     except Exception as e:
@@ -160,28 +140,9 @@ def admin_dashboard():
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     
     try:
-        # Get ticket statistics
-        cursor.execute("""
-            SELECT 
-                status,
-                COUNT(*) as count
-            FROM tickets 
-            GROUP BY status
-        """)
-        ticket_stats = cursor.fetchall()
-        
-        # Convert to a dictionary for easier access
-        ticket_counts = {stat['status']: stat['count'] for stat in ticket_stats}
-        
-        # Get user role statistics
-        cursor.execute("""
-            SELECT 
-                role,
-                COUNT(*) as count
-            FROM "Accounts" 
-            GROUP BY role
-        """)
-        role_stats = cursor.fetchall()
+        # Ticket / role statistics from the trigger-maintained counters
+        ticket_counts = dashboard_counters.ticket_counts(cursor)
+        role_counts = dashboard_counters.role_counts(cursor)
         
         # Get all accounts for the table
         cursor.execute("""
@@ -196,7 +157,7 @@ def admin_dashboard():
         return render_template(
             "admin_main.html",
             ticket_counts=ticket_counts,
-            role_counts={stat['role']: stat['count'] for stat in role_stats},
+            role_counts=role_counts,
             accounts=accounts
         )
         
@@ -246,7 +207,7 @@ def update_account(user_id):
                 account_status = %s,
                 password_hash = %s
             WHERE user_id = %s
-        """, (username, email, contact_number, account_status, ripbcrypt.hashpw(password, ripbcrypt.gensalt()) ,user_id))
+        """, (username, email, contact_number, account_status, hash_pool.hashpw(password) ,user_id))
         else :
              cursor.execute("""
             UPDATE "Accounts"
@@ -260,15 +221,16 @@ def update_account(user_id):
         # Handle specialties only if role = Staff
         cursor.execute("DELETE FROM staffspeciality WHERE user_id = %s", (user_id,))
         if role == "Staff" and specialties:
-            for spec in specialties:
-                cursor.execute("""
-                    INSERT INTO staffspeciality (user_id, speciality)
-                    VALUES (%s, %s)
-                """, (user_id, spec))
+            bulk_write.insert_many(cursor, "staffspeciality", ("user_id", "speciality", "speciality_id"),
+                                   skill_index.speciality_rows(cursor, user_id, specialties))
 
         conn.commit()
+        ref_cache.invalidate("skill_index")
         return jsonify({"message": "Account updated successfully"}), 200
 
+    except hash_pool.HashPoolFull:
+        conn.rollback()
+        return hash_pool.busy_response()
     except Exception as e:
         conn.rollback()
         return jsonify({"error": str(e)}), 500
@@ -301,7 +263,7 @@ def update_own_account():
             return redirect(url_for('user.user_dashboard'))
         
         # Verify current password with bcrypt
-        if not ripbcrypt.checkpw(current_password, user['password_hash']):
+        if not hash_pool.checkpw(current_password, user['password_hash']):
             flash("Current password is incorrect", "error")
             return redirect(url_for('user.user_dashboard'))
         
@@ -314,13 +276,16 @@ def update_own_account():
         
         # Update password if provided
         if new_password:
-            hashed_pw = ripbcrypt.hashpw(new_password, ripbcrypt.gensalt())
+            hashed_pw = hash_pool.hashpw(new_password)
             cursor.execute('UPDATE "Accounts" SET password_hash = %s WHERE user_id = %s', 
                           (hashed_pw, user_id))
             flash("Password updated successfully", "success")
         
         conn.commit()
         
+    except hash_pool.HashPoolFull:
+        conn.rollback()
+        return hash_pool.busy_response()
     except Exception as e:
         conn.rollback()
         flash(f"Error updating account: {str(e)}", "error")
@@ -345,24 +310,10 @@ def api_get_transactions():
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
-        cursor.execute("""
-            SELECT th.transaction_id,
-                   th.ticket_id,
-                   th.action_type,
-                   th.action_by      AS action_by_id,
-                   a.username        AS action_by_username,
-                   th.action_time,
-                   th.detail
-            FROM transaction_history th
-            LEFT JOIN "Accounts" a ON th.action_by = a.user_id
-            ORDER BY transaction_id DESC
-        """)
-        transactions = cursor.fetchall()
-        bangkok = ZoneInfo("Asia/Bangkok")
-        for t in transactions:
-            if t["action_time"]:
-                t["action_time"] = t["action_time"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
-        return jsonify(transactions), 200
+        page = transaction_history.fetch_page(cursor, request.args)
+        return jsonify(page), 200
+    except transaction_history.BadQuery as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": f"Error fetching transactions: {str(e)}"}), 500
     finally:
@@ -390,3 +341,21 @@ def api_account_info():
     finally:
         cursor.close()
         conn.close()
+
+
+# -------------------------
+# Runtime stats: the in-process pools, caches and gateways, for monitoring
+# -------------------------
+@admin_bp.route('/api/runtime_stats', methods=['GET'])
+def api_runtime_stats():
+    if 'user_id' not in session or session.get('role') != 'Admin':
+        return jsonify({"message": "Unauthorized"}), 401
+
+    return jsonify({
+        "db_pool": db_pool.pool.stats(),
+        "hash_pool": hash_pool.stats(),
+        "dns_cache": dns_patch.cache.stats(),
+        "ref_cache": ref_cache.stats(),
+        "storage": storage_gateway.stats(),
+        "upload_queue": upload_queue.queue.stats(),
+    }), 200
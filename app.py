@@ -1,7 +1,12 @@
 import dns_patch
 from flask import Flask, render_template, request, redirect, session, jsonify, url_for
 import ripbcrypt
-import supabase
+import hash_pool
+import upload_queue
+import migrate
+import dashboard_counters
+import ref_cache
+import auto_assign
 import os
 from dotenv import load_dotenv
 import socket
@@ -16,19 +21,32 @@ from admin_main_core import admin_bp  # You'll need to create this
 from mod_main_core import mod_bp      # You'll need to create this
 import psycopg2
 import psycopg2.extras
+import db_pool
+from db_pool import get_db_connection
 # Load environment variables
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY")
+# Return pooled DB connections at the end of every request
+db_pool.init_app(app)
+# Turn a full password-hashing queue into 503 + Retry-After
+hash_pool.init_app(app)
+# Apply pending schema migrations (migrations/*.sql)
+migrate.init_app(app)
+# Bulk-load reference data (speciality index)
+ref_cache.init_app(app)
+# Deferred upload workers
+upload_queue.init_app(app)
+# Fold the dashboard counter deltas (and optionally reconcile them)
+dashboard_counters.init_app(app)
+# Optional scheduled batch auto-assignment of open tickets
+auto_assign.init_app(app)
 # Register blueprints with appropriate URL prefixes
 app.register_blueprint(user_bp, url_prefix='/user')
 app.register_blueprint(staff_bp, url_prefix='/staff')
 app.register_blueprint(admin_bp, url_prefix='/admin')  # Add this blueprint
 app.register_blueprint(mod_bp, url_prefix='/mod')      # Add this blueprint
 
-# Database connection function
-def get_db_connection():
-   return psycopg2.connect(os.getenv("DATABASE_URL"), sslmode="require")
 
 @app.route('/')
 def index():
@@ -57,11 +75,12 @@ def api_login():
         if user:
             if user['account_status'] == 0:
                 return jsonify({"message": "This account is banned."}), 403
-            elif ripbcrypt.checkpw(password, user['password_hash']):
-                # Update password hash
-                new_hash = ripbcrypt.hashpw(password, ripbcrypt.gensalt())
-                cursor.execute('UPDATE "Accounts" SET password_hash = %s WHERE user_id = %s', (new_hash, user_id))
-                conn.commit()
+            elif hash_pool.checkpw(password, user['password_hash']):
+                # Upgrade the stored hash only if it is below the current policy
+                if ripbcrypt.needs_rehash(user['password_hash']):
+                    new_hash = hash_pool.hashpw(password)
+                    cursor.execute('UPDATE "Accounts" SET password_hash = %s WHERE user_id = %s', (new_hash, user_id))
+                    conn.commit()
 
                 # Store user info in session
                 session['user_id'] = user['user_id']
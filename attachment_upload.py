@@ -0,0 +1,149 @@
+import os
+from contextlib import ExitStack
+import psycopg2
+import bulk_write
+import storage_gateway
+import upload_queue
+import upload_spool
+
+# -------------------------
+# Attachment upload pipeline for ticket create/update/upload.
+# Every file of a request is spooled first. Files over the inline threshold
+# then go to storage concurrently (UPLOAD_PARALLELISM at a time, submitted
+# straight to the storage gateway's workers), and all attachment rows are
+# written with one multi-row INSERT. Request latency follows the slowest
+# upload rather than the sum of them.
+# With DEFERRED_UPLOADS=1 large files are queued instead (see upload_queue).
+# -------------------------
+
+MAX_INLINE_SIZE = 1 * 1024 * 1024  # 1 MB threshold for DB storage
+UPLOAD_PARALLELISM = int(os.getenv("ATTACHMENT_UPLOAD_PARALLELISM", "4"))
+
+COLUMNS = ("ticket_id", "filename", "mime_type", "filedata", "file_url", "upload_date", "storage_status")
+
+
+def _start_upload(ticket_id, upload):
+    """(StorageCall, open spool file); the file stays open until the call is done."""
+    f = upload.open()
+    try:
+        return storage_gateway.upload_async(storage_gateway.storage_path_for(ticket_id, upload.filename), f,
+                                            content_type=upload.mimetype), f
+    except Exception:
+        f.close()
+        raise
+
+
+def _upload_all(ticket_id, uploads):
+    """
+    Upload to storage with at most UPLOAD_PARALLELISM in flight; a slot is
+    refilled as soon as any upload in it finishes.
+    Returns [(file_url, error)] in the order of uploads.
+    """
+    outcomes = [None] * len(uploads)
+    queue = iter(enumerate(uploads))
+    in_flight = {}  # StorageCall -> (index, open file)
+
+    def fill():
+        while len(in_flight) < UPLOAD_PARALLELISM:
+            item = next(queue, None)
+            if item is None:
+                return
+            index, upload = item
+            try:
+                call, f = _start_upload(ticket_id, upload)
+            except Exception as e:  # e.g. breaker open: fails without a call
+                outcomes[index] = (None, str(e))
+                continue
+            in_flight[call] = (index, f)
+
+    fill()
+    while in_flight:
+        for call in storage_gateway.wait_any(list(in_flight)):
+            index, f = in_flight.pop(call)
+            try:
+                outcomes[index] = (call.result(), None)
+            except Exception as e:
+                outcomes[index] = (None, str(e))
+            finally:
+                f.close()
+        fill()
+    return outcomes
+
+
+def _spool_all(stack, files):
+    uploads = []
+    for file in files:
+        if not file or file.filename == '':
+            continue  # Skip empty file inputs
+        upload = stack.enter_context(upload_spool.spool(file, MAX_INLINE_SIZE))
+        if upload.size == 0:
+            continue
+        uploads.append(upload)
+    return uploads
+
+
+def save_files(cursor, ticket_id, files, now, deferred=None):
+    """
+    Store request.files entries as attachments of ticket_id.
+    Small files go inline as bytea; larger ones go to storage, falling back to
+    inline bytea (streamed from the spool file) when the upload fails.
+    In deferred mode (upload_queue.DEFERRED_UPLOADS) large files are handed
+    to the background upload queue instead and their rows start 'pending'.
+    Returns one outcome per stored file, in request order:
+        {"id", "filename", "inline", "storage", "sha256", "url"?, "error"?}
+    where storage is "inline", "external", "fallback" or "pending".
+    """
+    if deferred is None:
+        deferred = upload_queue.DEFERRED_UPLOADS
+
+    with ExitStack() as stack:
+        uploads = _spool_all(stack, files)
+        if not uploads:
+            return []
+
+        external = [u for u in uploads if not u.inline]
+        if deferred:
+            queued = {id(u): storage_gateway.storage_path_for(ticket_id, u.filename) for u in external}
+        else:
+            uploaded = dict(zip(map(id, external), _upload_all(ticket_id, external)))
+
+        rows = []
+        results = []
+        for upload in uploads:
+            result = {"filename": upload.filename, "sha256": upload.sha256}
+            status = "stored"
+            if upload.inline:
+                filedata, file_url = psycopg2.Binary(upload.data()), None
+                result.update(inline=True, storage="inline")
+            elif deferred:
+                filedata, file_url, status = None, None, "pending"
+                result.update(inline=False, storage="pending")
+            else:
+                file_url, error = uploaded[id(upload)]
+                if error is None:
+                    filedata = None
+                    result.update(inline=False, storage="external", url=file_url)
+                else:
+                    print(f"Supabase upload error: {error}")
+                    # Filled in below from the spool file, so it never sits in memory whole.
+                    # 'fallback' marks the row for upload_queue.migrate_fallbacks()
+                    filedata, status = None, "fallback"
+                    result.update(inline=True, storage="fallback", error=error)
+            rows.append((ticket_id, upload.filename, upload.mimetype, filedata, file_url, now, status))
+            results.append(result)
+
+        # IDs are reserved first so each row is tied to its file without relying on RETURNING order
+        ids = bulk_write.next_ids(cursor, "ticket_attachments", len(rows))
+        for result, attachment_id in zip(results, ids):
+            result["id"] = attachment_id
+        # One round trip for every row
+        bulk_write.insert_many(cursor, "ticket_attachments", ("id",) + COLUMNS,
+                               [(attachment_id,) + row for attachment_id, row in zip(ids, rows)])
+
+        for upload, result in zip(uploads, results):
+            if result["storage"] == "pending":
+                upload_queue.queue.enqueue(cursor, result["id"], upload, queued[id(upload)])
+            elif result["storage"] == "fallback":
+                with upload.open() as f:
+                    bulk_write.write_blob(cursor, "ticket_attachments", "filedata", result["id"], f)
+        return results
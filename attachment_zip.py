@@ -0,0 +1,274 @@
+import mimetypes
+import os
+import uuid
+import zipfile
+from collections import deque
+from flask import Response, jsonify, stream_with_context
+import psycopg2.extras
+from db_pool import get_db_connection
+import storage_gateway
+
+# -------------------------
+# Streaming "download all attachments" ZIP, shared by user/staff/mod.
+# The archive is written into a small sink that is drained after every chunk,
+# so the response starts immediately and memory never holds the whole ZIP.
+# -------------------------
+
+CHUNK_SIZE = 64 * 1024
+# Inline blobs larger than this are read from Postgres in substring() slices
+BLOB_READ_SIZE = 1 * 1024 * 1024
+# Storage downloads: per-archive parallelism and per-file timeout (seconds)
+DOWNLOAD_PARALLELISM = int(os.getenv("ZIP_DOWNLOAD_PARALLELISM", "4"))
+DOWNLOAD_TIMEOUT = float(os.getenv("ZIP_DOWNLOAD_TIMEOUT", "30"))
+
+# Attachments kept in storage (or still on their way there); params: (ticket_id,)
+EXTERNAL_SQL = """
+    SELECT id, filename, mime_type, file_url, storage_status
+    FROM ticket_attachments
+    WHERE ticket_id = %s AND filedata IS NULL
+      AND (file_url IS NOT NULL OR storage_status <> 'stored')
+    ORDER BY id
+"""
+# Attachments stored in Postgres; params: (BLOB_READ_SIZE, ticket_id)
+INLINE_SQL = """
+    SELECT id, filename, mime_type,
+           octet_length(filedata) AS filesize,
+           CASE WHEN octet_length(filedata) <= %s THEN filedata END AS filedata
+    FROM ticket_attachments
+    WHERE ticket_id = %s AND octet_length(filedata) > 0
+    ORDER BY id
+"""
+
+# Formats that are already compressed: deflating them again only burns CPU
+_STORED_PREFIXES = ("image/", "video/", "audio/")
+_STORED_TYPES = {
+    "application/pdf",
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+_COMPRESSIBLE_IMAGES = {"image/svg+xml", "image/bmp", "image/x-ms-bmp", "image/tiff"}
+
+
+def compress_type_for(filename, mime_type):
+    mime_type = (mime_type or mimetypes.guess_type(filename or "")[0] or "").lower()
+    if mime_type in _COMPRESSIBLE_IMAGES:
+        return zipfile.ZIP_DEFLATED
+    if mime_type in _STORED_TYPES or mime_type.startswith(_STORED_PREFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _Sink:
+    """Write-only, non-seekable file object; zipfile then uses data descriptors."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _write_entry(zipf, sink, filename, pieces, file_size, compress_type):
+    """
+    Write one entry from an iterable of byte pieces, in CHUNK_SIZE slices,
+    yielding whatever the sink collected along the way.
+    """
+    info = zipfile.ZipInfo(filename)
+    info.compress_type = compress_type
+    info.file_size = file_size
+    with zipf.open(info, "w") as entry:
+        for piece in pieces:
+            view = memoryview(piece)
+            for start in range(0, len(view), CHUNK_SIZE):
+                entry.write(view[start:start + CHUNK_SIZE])
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+def _write_bytes(zipf, sink, filename, data, compress_type):
+    yield from _write_entry(zipf, sink, filename, [data], len(data), compress_type)
+
+
+def _blob_slices(conn, attachment_id, size):
+    """Read one large inline blob in BLOB_READ_SIZE slices."""
+    cursor = conn.cursor()
+    try:
+        for offset in range(1, size + 1, BLOB_READ_SIZE):
+            cursor.execute(
+                "SELECT substring(filedata FROM %s FOR %s) FROM ticket_attachments WHERE id = %s",
+                (offset, BLOB_READ_SIZE, attachment_id))
+            yield cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def _fetch_external(external, start_download):
+    """
+    Start downloads for externally stored rows, at most DOWNLOAD_PARALLELISM
+    in flight, and return an iterator of (row, result, error) in the original
+    row order, plus a cancel() that drops the downloads no worker has started
+    (for an archive abandoned midway). The first downloads are submitted
+    before this returns, so they run while the caller streams the inline blobs.
+    """
+    pending = deque()
+    rows = iter(external)
+
+    def submit_next():
+        row = next(rows, None)
+        if row is None:
+            return
+        if row["file_url"] is None:  # Deferred upload still pending: nothing to fetch
+            pending.append((row, None))
+            return
+        bucket_name, file_path = storage_gateway.extract_bucket_and_path(row["file_url"])
+        pending.append((row, start_download(bucket_name, file_path)))
+
+    for _ in range(DOWNLOAD_PARALLELISM):
+        submit_next()
+
+    def results():
+        while pending:
+            row, call = pending.popleft()
+            if call is None:
+                submit_next()
+                yield row, None, None
+                continue
+            try:
+                # Bounded by DOWNLOAD_TIMEOUT from when the gateway starts the download
+                result, error = call.result(), None
+            except Exception as e:
+                result, error = None, str(e)
+            submit_next()
+            yield row, result, error
+
+    def cancel():
+        for _, call in pending:
+            if call is not None:
+                call.cancel()
+
+    return results(), cancel
+
+
+def _generate(conn, inline_rows, external, start_download, on_close):
+    sink = _Sink()
+    cancel_downloads = None
+    try:
+        # Kick off storage downloads first (submitted right here) so they overlap with the DB blobs
+        downloads, cancel_downloads = _fetch_external(external, start_download)
+        with zipfile.ZipFile(sink, "w") as zipf:
+            for att in inline_rows:
+                compress_type = compress_type_for(att["filename"], att["mime_type"])
+                if att["filedata"]:  # Small enough to come with the row
+                    yield from _write_bytes(zipf, sink, att["filename"], att["filedata"], compress_type)
+                else:  # Large inline blob, streamed in slices
+                    yield from _write_entry(zipf, sink, att["filename"],
+                                            _blob_slices(conn, att["id"], att["filesize"]),
+                                            att["filesize"], compress_type)
+                # Drop this row (and its blob) before the cursor fetches the next one
+                att = None
+
+            for att, res, error in downloads:  # Stored in Supabase
+                if att["file_url"] is None:
+                    yield from _write_bytes(zipf, sink, att["filename"] + f".{att['storage_status']}.txt",
+                                            f"File is not in storage yet (status: {att['storage_status']}).".encode("utf-8"),
+                                            zipfile.ZIP_DEFLATED)
+                elif error is not None:
+                    yield from _write_bytes(zipf, sink, att["filename"] + ".error.txt",
+                                            f"Error downloading file: {error}".encode("utf-8"),
+                                            zipfile.ZIP_DEFLATED)
+                elif res is not None:
+                    yield from _write_bytes(zipf, sink, att["filename"], res,
+                                            compress_type_for(att["filename"], att["mime_type"]))
+                else:
+                    yield from _write_bytes(zipf, sink, att["filename"] + ".url.txt",
+                                            f"File could not be retrieved. Original URL: {att['file_url']}".encode("utf-8"),
+                                            zipfile.ZIP_DEFLATED)
+                res = None
+        # Central directory is written when the ZipFile closes
+        tail = sink.drain()
+        if tail:
+            yield tail
+    finally:
+        if cancel_downloads is not None:
+            cancel_downloads()
+        on_close()
+
+
+def _gateway_download(bucket, path):
+    return storage_gateway.download_async(path, bucket, timeout=DOWNLOAD_TIMEOUT)
+
+
+def download_all_response(ticket_id, start_download=_gateway_download):
+    """
+    Chunked ZIP response with every attachment of ticket_id.
+    start_download(bucket, path) starts fetching an externally stored file and
+    returns a storage_gateway.StorageCall (the gateway by default). The DB connection
+    stays checked out until the last chunk has been sent.
+    Entries are written inline rows first, then storage rows, each by id.
+    """
+    conn = get_db_connection()
+    meta = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    # Named (server-side) cursor: inline rows, and their blobs, arrive one at a time
+    cursor = conn.cursor(name=f"attachments_{uuid.uuid4().hex}",
+                         cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.itersize = 1
+
+    def close():
+        meta.close()
+        cursor.close()
+        conn.close()
+
+    try:
+        # No blobs here, so the whole list is cheap to hold
+        meta.execute(EXTERNAL_SQL, (ticket_id,))
+        external = meta.fetchall()
+
+        cursor.execute(INLINE_SQL, (BLOB_READ_SIZE, ticket_id))
+        first = cursor.fetchone()
+    except Exception:
+        close()
+        raise
+
+    if first is None and not external:
+        close()
+        return jsonify({"message": "No attachments found"}), 404
+
+    # Hand the first row over without keeping a reference to its blob
+    pending = [first] if first is not None else []
+    del first
+
+    def rows():
+        if pending:
+            yield pending.pop()
+            yield from cursor
+
+    body = _generate(conn, rows(), external, start_download, close)
+    return Response(
+        stream_with_context(body),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="ticket_{ticket_id}_attachments.zip"'},
+    )
+
@@ -0,0 +1,162 @@
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+import psycopg2.extras
+from db_pool import get_db_connection
+import ref_cache
+import staff_workload
+import transaction_history
+
+# -------------------------
+# Batch auto-assignment of open, unassigned tickets.
+# Tickets are taken most urgent / oldest first and each goes to the least
+# loaded staff member with a matching speciality ("Other" -> any staff) who
+# is still under AUTO_ASSIGN_CAPACITY open tickets. All assignments and their
+# history rows commit in one transaction; dry_run only reports the plan.
+# Runs from POST /mod/api/tickets/auto_assign, on a timer when
+# AUTO_ASSIGN_INTERVAL is set (seconds, 0 = off), or by hand:
+#
+#   python auto_assign.py [--dry-run]
+# -------------------------
+
+AUTO_ASSIGN_CAPACITY = int(os.getenv("AUTO_ASSIGN_CAPACITY", "10"))   # max open tickets per staff
+AUTO_ASSIGN_BATCH = int(os.getenv("AUTO_ASSIGN_BATCH", "500"))        # max tickets per run
+AUTO_ASSIGN_INTERVAL = float(os.getenv("AUTO_ASSIGN_INTERVAL", "0"))
+AUTO_ASSIGN_ACTOR = os.getenv("AUTO_ASSIGN_ACTOR")                   # user_id recorded for scheduled runs
+LOCK_ID = 720_394_119  # pg_advisory_xact_lock key; one run at a time
+
+# Most urgent first; unknown / empty urgency sorts last. The open-queue index
+# (migrations/0009) is built on this exact expression; change both together.
+URGENCY_RANK_SQL = """
+    CASE t.urgency
+        WHEN 'Critical' THEN 0
+        WHEN 'High' THEN 1
+        WHEN 'Medium' THEN 2
+        WHEN 'Low' THEN 3
+        ELSE 4
+    END
+"""
+
+
+# params: (limit,)
+OPEN_TICKETS_SQL = f"""
+    SELECT t.ticket_id, t.type, t.urgency
+    FROM tickets t
+    WHERE t.status = 'Open' AND t.assigner_id IS NULL
+    ORDER BY {URGENCY_RANK_SQL}, t.created_date, t.ticket_id
+    LIMIT %s
+"""
+
+
+def _open_tickets(cursor, limit, lock):
+    cursor.execute(OPEN_TICKETS_SQL + ("FOR UPDATE SKIP LOCKED" if lock else ""), (limit,))
+    return cursor.fetchall()
+
+
+def plan(cursor, capacity=AUTO_ASSIGN_CAPACITY, limit=AUTO_ASSIGN_BATCH, lock=False):
+    """
+    (assignments, skipped) for the current backlog.
+    assignments: [{ticket_id, type, urgency, staff_id, staff_username}]
+    skipped:     [{ticket_id, type, urgency, reason}]
+    """
+    index = ref_cache.staff_index(cursor)
+    staff = {row["user_id"]: row for row in staff_workload.workloads(cursor)}
+    load = {user_id: row["current_assignment_count"] for user_id, row in staff.items()}
+
+    assignments, skipped = [], []
+    for ticket in _open_tickets(cursor, limit, lock):
+        ticket_type = ticket["type"] or "Other"
+        if ticket_type.lower() == "other":
+            candidates = load.keys()
+        else:
+            candidates = [user_id for user_id in index.candidates(ticket_type) if user_id in load]
+        if not candidates:
+            skipped.append(dict(ticket, reason="no staff with this speciality"))
+            continue
+        staff_id = min(candidates, key=lambda user_id: (load[user_id], user_id))
+        if load[staff_id] >= capacity:
+            skipped.append(dict(ticket, reason="all matching staff at capacity"))
+            continue
+        load[staff_id] += 1
+        assignments.append(dict(ticket, staff_id=staff_id, staff_username=staff[staff_id]["username"]))
+    return assignments, skipped
+
+
+def assign_batch(cursor, actor, dry_run=False, capacity=AUTO_ASSIGN_CAPACITY, limit=AUTO_ASSIGN_BATCH):
+    """
+    Plan and (unless dry_run) apply one batch on the caller's transaction;
+    the caller commits. Returns {dry_run, assigned, skipped}.
+    """
+    if not dry_run:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_ID,))
+    assignments, skipped = plan(cursor, capacity, limit, lock=not dry_run)
+
+    if assignments and not dry_run:
+        now = datetime.now(timezone.utc)
+        psycopg2.extras.execute_values(cursor, """
+            UPDATE tickets t
+            SET status = 'Assigned-in_queue', assigner_id = v.staff_id, last_update = v.last_update
+            FROM (VALUES %s) AS v(ticket_id, staff_id, last_update)
+            WHERE t.ticket_id = v.ticket_id
+        """, [(a["ticket_id"], a["staff_id"], now) for a in assignments], page_size=len(assignments))
+        transaction_history.record(cursor, *[
+            (a["ticket_id"], 'assign', actor, now,
+             f'Ticket auto-assigned to staff: {a["staff_username"]} (ID: {a["staff_id"]})')
+            for a in assignments
+        ])
+    return {"dry_run": dry_run, "assigned": assignments, "skipped": skipped}
+
+
+def run(connect=get_db_connection, actor=AUTO_ASSIGN_ACTOR, dry_run=False,
+        capacity=AUTO_ASSIGN_CAPACITY, limit=AUTO_ASSIGN_BATCH):
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        result = assign_batch(cursor, actor, dry_run, capacity, limit)
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _schedule_loop(stop):
+    while not stop.wait(AUTO_ASSIGN_INTERVAL):
+        try:
+            result = run()
+            if result["assigned"]:
+                print(f"Auto-assigned {len(result['assigned'])} ticket(s), {len(result['skipped'])} left open")
+        except Exception as e:
+            print(f"Auto-assign run failed: {e}")
+
+
+_stop = threading.Event()
+
+
+def init_app(app):
+    if AUTO_ASSIGN_INTERVAL <= 0:
+        return
+    if not AUTO_ASSIGN_ACTOR:
+        print("AUTO_ASSIGN_INTERVAL is set but AUTO_ASSIGN_ACTOR is not; scheduled auto-assign disabled")
+        return
+    threading.Thread(target=_schedule_loop, args=(_stop,), name="auto-assign", daemon=True).start()
+
+
+if __name__ == '__main__':
+    dry_run = "--dry-run" in sys.argv
+    if not dry_run and not AUTO_ASSIGN_ACTOR:
+        sys.exit("Set AUTO_ASSIGN_ACTOR to the user_id recorded in the history rows")
+    result = run(dry_run=dry_run)
+    for a in result["assigned"]:
+        print(f"{a['ticket_id']} ({a['urgency']}, {a['type']}) -> {a['staff_username']} ({a['staff_id']})")
+    for s in result["skipped"]:
+        print(f"{s['ticket_id']} ({s['urgency']}, {s['type']}) skipped: {s['reason']}")
+    print(f"{'Would assign' if result['dry_run'] else 'Assigned'} {len(result['assigned'])}, "
+          f"skipped {len(result['skipped'])}")
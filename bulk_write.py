@@ -0,0 +1,101 @@
+import io
+import os
+from datetime import date, datetime
+import psycopg2.extensions
+import psycopg2.extras
+
+# -------------------------
+# Multi-row writes in one round trip.
+# insert_many() sends every row in a single INSERT ... VALUES (...), (...)
+# (execute_values), or streams them with COPY when the batch is large and no
+# RETURNING is needed. write_blob() fills one large bytea value from a file
+# without holding it in memory or rewriting it piecewise. Table/column names
+# come from our own code, never from request data.
+# -------------------------
+
+COPY_THRESHOLD = int(os.getenv("BULK_COPY_THRESHOLD", "500"))  # rows; COPY beyond this
+BLOB_CHUNK_SIZE = 1 * 1024 * 1024
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, psycopg2.extensions.Binary):
+        value = value.adapted  # psycopg2.Binary(...) rows work on both paths
+    elif hasattr(value, "getquoted"):
+        # Other psycopg2 adapters render SQL literals, which COPY would store verbatim
+        raise TypeError(f"cannot COPY a {type(value).__name__} value; pass the raw value")
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        text = "\\x" + bytes(value).hex()
+    elif isinstance(value, (datetime, date)):
+        text = value.isoformat()
+    elif isinstance(value, bool):
+        text = "t" if value else "f"
+    else:
+        text = str(value)
+    return (text.replace("\\", "\\\\").replace("\t", "\\t")
+                .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY rows into table (text format). Returns the number of rows sent."""
+    buf = io.StringIO()
+    count = 0
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+        count += 1
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+    return count
+
+
+def insert_many(cursor, table, columns, rows, returning=None):
+    """
+    Insert rows (sequences matching columns) with one statement.
+    PostgreSQL does not promise RETURNING rows in VALUES order: return a
+    column that identifies the input row, or allocate keys up front with
+    next_ids() and insert them explicitly.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    if returning is None and len(rows) >= COPY_THRESHOLD:
+        copy_rows(cursor, table, columns, rows)
+        return []
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+    if returning:
+        sql += f" RETURNING {returning}"
+    result = psycopg2.extras.execute_values(cursor, sql, rows, page_size=len(rows),
+                                            fetch=bool(returning))
+    return result if returning else []
+
+
+def next_ids(cursor, table, count, column="id"):
+    """Reserve count values of table.column's sequence, in one round trip."""
+    if count <= 0:
+        return []
+    cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) AS id FROM generate_series(1, %s)",
+                   (table, column, count))
+    return [row["id"] if isinstance(row, dict) else row[0] for row in cursor.fetchall()]
+
+
+def write_blob(cursor, table, column, row_id, fileobj, chunk_size=BLOB_CHUNK_SIZE):
+    """
+    Set the bytea table.column of row id = row_id to the contents of fileobj.
+    The file is streamed into a temporary large object (every page written
+    once), copied into the row with a single lo_get() UPDATE and unlinked.
+    Runs in the caller's transaction; a rollback discards the large object too.
+    """
+    lobj = cursor.connection.lobject(0, "wb")
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            lobj.write(chunk)
+        oid = lobj.oid
+    finally:
+        lobj.close()
+    cursor.execute(f"UPDATE {table} SET {column} = lo_get(%s) WHERE id = %s", (oid, row_id))
+    cursor.execute("SELECT lo_unlink(%s)", (oid,))
@@ -0,0 +1,40 @@
+from flask import Response, jsonify, request
+from werkzeug.http import is_resource_modified
+
+# -------------------------
+# Conditional GET (ETag / Last-Modified) for the ticket APIs.
+# Detail endpoints compare the request against ticket_detail.validators()
+# before building anything and answer 304 on a match. List pages are tagged
+# from their body, which still saves the transfer and the client's re-render.
+# Responses are "private, no-cache": the browser keeps them but revalidates
+# every time, so a changed ticket is never served stale.
+# -------------------------
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def _tag(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """A 304 response if the client's copy is current, else None."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return _tag(Response(status=304), etag, last_modified)
+
+
+def json_response(payload, etag, last_modified=None):
+    return _tag(jsonify(payload), etag, last_modified)
+
+
+def json_page(payload):
+    """jsonify a list page with an ETag of its body; 304 if the client has it."""
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response.make_conditional(request)
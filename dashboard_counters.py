@@ -0,0 +1,165 @@
+import os
+import threading
+import psycopg2.extras
+from db_pool import get_db_connection
+
+# -------------------------
+# Admin dashboard statistics from a trigger-maintained summary table.
+# Triggers on tickets / "Accounts" (migrations/0004, 0008) append a +1/-1
+# row to dashboard_counter_deltas on every insert, delete and status/role
+# change. Appends never wait on each other, so no ticket transaction holds a
+# shared counter lock while it does I/O. fold() periodically sums the deltas
+# into dashboard_counters (DASHBOARD_FOLD_INTERVAL seconds); reads add the
+# unfolded tail, so they are exact at any time and still only touch a
+# handful of rows.
+# reconcile() recounts from the source tables in one snapshot and records any
+# drift as a correcting delta -- no table locks. It runs every
+# DASHBOARD_RECONCILE_INTERVAL seconds (0 = off) or by hand:
+#
+#   python dashboard_counters.py            fold, then reconcile
+# -------------------------
+
+FOLD_INTERVAL = float(os.getenv("DASHBOARD_FOLD_INTERVAL", "10"))
+FOLD_BATCH = int(os.getenv("DASHBOARD_FOLD_BATCH", "5000"))
+RECONCILE_INTERVAL = float(os.getenv("DASHBOARD_RECONCILE_INTERVAL", "0"))
+
+# kind -> (table, column) the counters are derived from
+SOURCES = {
+    "ticket_status": ("tickets", "status"),
+    "account_role": ('"Accounts"', "role"),
+}
+
+
+def _stored(cursor, kind):
+    """{key: count} from folded counters plus pending deltas ('' = NULL key)."""
+    cursor.execute("""
+        SELECT key, SUM(count)::bigint AS count
+        FROM (
+            SELECT key, count FROM dashboard_counters WHERE kind = %s
+            UNION ALL
+            SELECT key, delta FROM dashboard_counter_deltas WHERE kind = %s
+        ) c
+        GROUP BY key
+    """, (kind, kind))
+    return {row["key"]: row["count"] for row in cursor.fetchall()}
+
+
+def counts(cursor, kind):
+    """{key: count} for one counter kind (NULL keys come back as None)."""
+    return {key or None: count for key, count in _stored(cursor, kind).items() if count > 0}
+
+
+def ticket_counts(cursor):
+    return counts(cursor, "ticket_status")
+
+
+def role_counts(cursor):
+    return counts(cursor, "account_role")
+
+
+def fold(connect=get_db_connection, batch=FOLD_BATCH):
+    """
+    Move committed deltas into dashboard_counters, batch by batch, each in
+    its own short transaction. Returns the number of delta rows folded.
+    """
+    conn = connect()
+    cursor = conn.cursor()
+    folded = 0
+    try:
+        while True:
+            cursor.execute("""
+                WITH moved AS (
+                    DELETE FROM dashboard_counter_deltas
+                    WHERE id IN (
+                        SELECT id FROM dashboard_counter_deltas
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING kind, key, delta
+                ), summed AS (
+                    INSERT INTO dashboard_counters (kind, key, count)
+                    SELECT kind, key, SUM(delta) FROM moved
+                    GROUP BY kind, key
+                    ORDER BY kind, key
+                    ON CONFLICT (kind, key) DO UPDATE SET count = dashboard_counters.count + EXCLUDED.count
+                )
+                SELECT COUNT(*) FROM moved
+            """, (batch,))
+            moved = cursor.fetchone()[0]
+            conn.commit()
+            folded += moved
+            if moved < batch:
+                return folded
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def reconcile(connect=get_db_connection):
+    """
+    Compare the counters with a fresh count and append a correcting delta
+    for every key that drifted. Both sides are read from one REPEATABLE READ
+    snapshot, so concurrent writers neither block nor skew the comparison.
+    Returns {kind: {key: (stored, actual)}} for the keys that were wrong.
+    """
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    drift = {}
+    try:
+        conn.rollback()  # SET TRANSACTION must be the first statement
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        for kind, (table, column) in SOURCES.items():
+            cursor.execute(f"""
+                SELECT COALESCE({column}::text, '') AS key, COUNT(*) AS count
+                FROM {table}
+                GROUP BY 1
+            """)
+            actual = {row["key"]: row["count"] for row in cursor.fetchall()}
+            stored = _stored(cursor, kind)
+
+            wrong = {key: (stored.get(key, 0), actual.get(key, 0))
+                     for key in set(stored) | set(actual)
+                     if stored.get(key, 0) != actual.get(key, 0)}
+            if wrong:
+                psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO dashboard_counter_deltas (kind, key, delta) VALUES %s
+                """, [(kind, key, new - old) for key, (old, new) in wrong.items()])
+                drift[kind] = wrong
+        conn.commit()
+        return drift
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _every(interval, job, label, stop):
+    while not stop.wait(interval):
+        try:
+            result = job()
+            if result and job is reconcile:
+                print(f"Dashboard counters drifted, corrected: {result}")
+        except Exception as e:
+            print(f"Dashboard counter {label} failed: {e}")
+
+
+_stop = threading.Event()
+
+
+def init_app(app):
+    for interval, job, label in ((FOLD_INTERVAL, fold, "fold"), (RECONCILE_INTERVAL, reconcile, "reconcile")):
+        if interval > 0:
+            threading.Thread(target=_every, args=(interval, job, label, _stop),
+                             name=f"dashboard-{label}", daemon=True).start()
+
+
+if __name__ == '__main__':
+    print(f"Folded {fold()} delta row(s)")
+    drift = reconcile()
+    print(f"Drift corrected: {drift or 'none'}")
@@ -0,0 +1,287 @@
+import functools
+import os
+import re
+import threading
+import time
+from dotenv import load_dotenv
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from flask import g, has_app_context
+
+# -------------------------
+# Shared PostgreSQL connection pool used by every blueprint.
+# get_db_connection() keeps its old name and shape, so handlers still do
+# conn = get_db_connection() ... conn.close() -- close() just hands the
+# connection back to the pool instead of tearing down TCP/TLS.
+# -------------------------
+
+load_dotenv()
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "10"))  # seconds to wait for a free slot
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))        # recycle connections older than this
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))              # ping idle connections older than this
+# Server-side PREPARE/EXECUTE in execute_prepared(). Leave off behind a
+# transaction-mode pooler (PgBouncer, Supabase's pooler on port 6543): the
+# next transaction may land on a server session that never saw the PREPARE.
+# Turn on ("1") only for direct or session-mode connections.
+PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "0") == "1"
+
+_DOLLAR_PARAM = re.compile(r"\$(\d+)")
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the checkout timeout."""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a psycopg2 connection.
+    Everything is delegated except close(), which returns it to the pool.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = time.monotonic()
+        self._last_used = self._created_at
+        self._released = True
+        self._lease = 0          # bumped on every checkout
+        self._prepared = set()   # server-side prepared statements on this session
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if not self._released:
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    def __init__(self, dsn=None, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 timeout=POOL_CHECKOUT_TIMEOUT, max_lifetime=POOL_MAX_LIFETIME,
+                 ping_after=POOL_PING_AFTER, connect_kwargs=None):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.connect_kwargs = connect_kwargs if connect_kwargs is not None else {"sslmode": "require"}
+
+        self._idle = []          # LIFO stack of idle PooledConnection
+        self._size = 0           # idle + checked out
+        self._cond = threading.Condition()
+        self._filled = False
+        self._counters = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "broken": 0,
+        }
+
+    # ---- internals ----
+    def _connect(self):
+        raw = psycopg2.connect(self.dsn or os.getenv("DATABASE_URL"), **self.connect_kwargs)
+        with self._cond:
+            self._counters["created"] += 1
+        return PooledConnection(self, raw)
+
+    def _discard(self, pconn, counter):
+        try:
+            pconn._raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._counters[counter] += 1
+            self._cond.notify()
+
+    def _is_usable(self, pconn):
+        now = time.monotonic()
+        if pconn._raw.closed:
+            self._discard(pconn, "broken")
+            return False
+        if self.max_lifetime and now - pconn._created_at > self.max_lifetime:
+            self._discard(pconn, "recycled")
+            return False
+        # Only pay a round trip when the connection has been idle a while
+        if now - pconn._last_used > self.ping_after:
+            try:
+                with pconn._raw.cursor() as cur:
+                    cur.execute("SELECT 1")
+                pconn._raw.rollback()
+            except Exception:
+                self._discard(pconn, "broken")
+                return False
+        return True
+
+    def _fill_min(self):
+        self._filled = True
+        for _ in range(self.min_size):
+            with self._cond:
+                if self._size >= self.max_size:
+                    return
+                self._size += 1
+            try:
+                pconn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                return
+            with self._cond:
+                self._idle.append(pconn)
+                self._cond.notify()
+
+    # ---- public API ----
+    def getconn(self):
+        if not self._filled:
+            self._fill_min()
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            pconn = None
+            create = False
+            with self._cond:
+                waited = False
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout}s "
+                            f"(max_size={self.max_size})")
+                    if not waited:
+                        self._counters["waits"] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    pconn = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    pconn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(pconn):
+                continue
+
+            with self._cond:
+                # Under the lock, so release(pconn, lease) sees both or neither
+                pconn._released = False
+                pconn._lease += 1
+                self._counters["checkouts"] += 1
+            return pconn
+
+    def release(self, pconn, lease=None):
+        """
+        Return pconn to the pool. Given a lease, only if pconn is still on that
+        checkout: a late caller must not hand back a connection that has since
+        gone to another request.
+        """
+        with self._cond:
+            if pconn._released or (lease is not None and pconn._lease != lease):
+                return
+            pconn._released = True
+
+        raw = pconn._raw
+        if raw.closed:
+            self._discard(pconn, "broken")
+            return
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                raw.rollback()
+        except Exception:
+            self._discard(pconn, "broken")
+            return
+
+        pconn._last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pconn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for pconn in idle:
+            self._discard(pconn, "recycled")
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._counters)
+            data.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        return data
+
+
+pool = ConnectionPool()
+
+
+def get_db_connection():
+    """
+    Check a connection out of the shared pool.
+    Inside a request the connection is remembered on flask.g so the teardown
+    hook can return anything a handler forgot to close.
+    """
+    conn = pool.getconn()
+    if has_app_context():
+        g.setdefault("_db_conns", []).append((conn, conn._lease))
+    return conn
+
+
+@functools.lru_cache(maxsize=None)
+def pyformat(sql):
+    """$1, $2 ... placeholders as psycopg2 %(p1)s, %(p2)s ... (literal % escaped)."""
+    return _DOLLAR_PARAM.sub(r"%(p\1)s", sql.replace("%", "%%"))
+
+
+def execute_prepared(conn, cursor, name, sql, params):
+    """
+    EXECUTE the server-side prepared statement `name`, preparing `sql`
+    (written with $1, $2 ... placeholders) the first time this pooled
+    connection sees it. Prepared statements live as long as the session.
+    With DB_PREPARED_STATEMENTS off (the default) sql is simply executed
+    with the same parameters.
+    """
+    if not PREPARED_STATEMENTS:
+        cursor.execute(pyformat(sql), {f"p{i}": value for i, value in enumerate(params, 1)})
+        return
+    placeholders = ", ".join(["%s"] * len(params))
+    if name in conn._prepared:
+        try:
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+            return
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Session was reset under us (e.g. DISCARD ALL); prepare again
+            conn.rollback()
+            conn._prepared.discard(name)
+    cursor.execute(f"PREPARE {name} AS {sql}")
+    conn._prepared.add(name)
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+def _release_request_connections(exc=None):
+    for conn, lease in g.pop("_db_conns", []):
+        # No-op for connections the handler already closed (they may belong to another request by now)
+        conn._pool.release(conn, lease)
+
+
+def init_app(app):
+    app.teardown_appcontext(_release_request_connections)
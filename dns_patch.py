@@ -1,18 +1,204 @@
+import os
 import socket
+import ipaddress
+import threading
+import time
 import dns.resolver
 
+# -------------------------
+# In-process DNS cache in front of our public resolvers.
+# Answers are kept for their record TTL, failures are cached briefly, and hot
+# entries are refreshed in the background shortly before they expire.
+# -------------------------
+
+NAMESERVERS = os.getenv("DNS_NAMESERVERS", "8.8.8.8,1.1.1.1").split(",")  # Google + Cloudflare DNS
+NAMESERVER_PORT = int(os.getenv("DNS_NAMESERVER_PORT", "53"))
+MIN_TTL = float(os.getenv("DNS_MIN_TTL", "5"))
+MAX_TTL = float(os.getenv("DNS_MAX_TTL", "3600"))
+NEGATIVE_TTL = float(os.getenv("DNS_NEGATIVE_TTL", "5"))
+REFRESH_AHEAD = float(os.getenv("DNS_REFRESH_AHEAD", "0.2"))  # refresh in the last 20% of the TTL
+HOT_HITS = int(os.getenv("DNS_HOT_HITS", "2"))                # hits before an entry counts as hot
+
+
+def dnspython_resolve(hostname):
+    """
+    Default lookup: one A query against NAMESERVERS.
+    Returns (ip, ttl_seconds).
+    """
+    resolver = dns.resolver.Resolver(configure=False)
+    resolver.nameservers = NAMESERVERS
+    resolver.port = NAMESERVER_PORT
+    answer = resolver.resolve(hostname, "A")
+    return str(answer[0]), answer.rrset.ttl
+
+
+class _Entry:
+    __slots__ = ("ip", "error_type", "error_args", "error_message", "ttl", "expires_at", "hits", "refreshing")
+
+    def __init__(self, ip, error, ttl):
+        self.ip = ip
+        # Keep what the failure was, not the exception object: one instance
+        # raised in many threads would share (and keep growing) its traceback
+        self.error_type = type(error) if error is not None else None
+        self.error_args = error.args if error is not None else ()
+        self.error_message = str(error) if error is not None else None
+        self.ttl = ttl
+        self.expires_at = time.monotonic() + ttl
+        self.hits = 0
+        self.refreshing = False
+
+    def error(self):
+        """A new instance of the cached failure."""
+        try:
+            return self.error_type(*self.error_args)
+        except Exception:
+            return OSError(self.error_message)
+
+
+class _Flight:
+    """One in-progress lookup; concurrent misses for the same host wait on it."""
+    __slots__ = ("done", "entry")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+
+
+class DnsCache:
+    def __init__(self, resolve=dnspython_resolve, min_ttl=MIN_TTL, max_ttl=MAX_TTL,
+                 negative_ttl=NEGATIVE_TTL, refresh_ahead=REFRESH_AHEAD, hot_hits=HOT_HITS):
+        self.resolve = resolve
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.hot_hits = hot_hits
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "negative_hits": 0,
+            "failures": 0,
+            "refreshes": 0,
+        }
+
+    def _lookup(self, hostname):
+        try:
+            ip, ttl = self.resolve(hostname)
+            entry = _Entry(ip, None, min(max(ttl, self.min_ttl), self.max_ttl))
+        except Exception as e:
+            entry = _Entry(None, e, self.negative_ttl)
+            with self._lock:
+                self._counters["failures"] += 1
+        with self._lock:
+            old = self._entries.get(hostname)
+            if old is not None:
+                entry.hits = old.hits
+            self._entries[hostname] = entry
+        return entry
+
+    def _refresh(self, hostname):
+        try:
+            ip, ttl = self.resolve(hostname)
+        except Exception:
+            # Keep serving the old answer until it expires; a miss will retry
+            with self._lock:
+                self._counters["failures"] += 1
+                old = self._entries.get(hostname)
+                if old is not None:
+                    old.refreshing = False
+            return
+        entry = _Entry(ip, None, min(max(ttl, self.min_ttl), self.max_ttl))
+        with self._lock:
+            old = self._entries.get(hostname)
+            if old is not None:
+                entry.hits = old.hits
+            self._entries[hostname] = entry
+            self._counters["refreshes"] += 1
+
+    def get(self, hostname):
+        """
+        Return the cached IP for hostname, raising a copy of the cached error for
+        negative entries. Concurrent misses for one host share a single lookup.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is not None and entry.expires_at > now:
+                entry.hits += 1
+                if entry.error_type is not None:
+                    self._counters["negative_hits"] += 1
+                    raise entry.error()
+                self._counters["hits"] += 1
+                if (not entry.refreshing and entry.hits >= self.hot_hits
+                        and entry.expires_at - now <= entry.ttl * self.refresh_ahead):
+                    entry.refreshing = True
+                    threading.Thread(target=self._refresh, args=(hostname,), daemon=True).start()
+                return entry.ip
+            self._counters["misses"] += 1
+            flight = self._flights.get(hostname)
+            leader = flight is None
+            if leader:
+                flight = self._flights[hostname] = _Flight()
+            else:
+                self._counters["coalesced"] += 1
+
+        if leader:
+            try:
+                flight.entry = self._lookup(hostname)
+            finally:
+                with self._lock:
+                    del self._flights[hostname]
+                flight.done.set()
+        else:
+            flight.done.wait()
+        entry = flight.entry
+        if entry is None:
+            # The leader's resolver raised something _lookup doesn't catch
+            raise OSError(f"DNS lookup for {hostname} failed")
+        if entry.error_type is not None:
+            raise entry.error()
+        return entry.ip
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data["entries"] = len(self._entries)
+        lookups = data["hits"] + data["misses"] + data["negative_hits"]
+        data["hit_rate"] = (data["hits"] + data["negative_hits"]) / lookups if lookups else 0.0
+        return data
+
+
+cache = DnsCache()
+
+
+def _is_ip_literal(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
 def force_custom_dns(hostname):
-    resolver = dns.resolver.Resolver()
-    resolver.nameservers = ["8.8.8.8", "1.1.1.1"]  # Google + Cloudflare DNS
-    answer = resolver.resolve(hostname, "A")[0]
-    return str(answer)
+    return cache.get(hostname)
 
 # Override socket.getaddrinfo to use our resolver
 _orig_getaddrinfo = socket.getaddrinfo
 
 def custom_getaddrinfo(host, port, *args, **kwargs):
+    # Nothing to resolve for IP literals / localhost
+    if not host or not isinstance(host, str) or host == "localhost" or _is_ip_literal(host):
+        return _orig_getaddrinfo(host, port, *args, **kwargs)
     try:
         ip = force_custom_dns(host)
         return _orig_getaddrinfo(ip, port, *args, **kwargs)
     except Exception:
-        return _orig_getaddrinfo(host, port, *args, **kwargs)
\ No newline at end of file
+        return _orig_getaddrinfo(host, port, *args, **kwargs)
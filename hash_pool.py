@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+import ripbcrypt
+
+# -------------------------
+# Dedicated executor for password hashing.
+# PBKDF2 releases the GIL, so a small pool keeps hashing off the request
+# thread count; once workers + queue are full new jobs are refused right away
+# (503 + Retry-After) instead of piling up behind a login storm.
+# -------------------------
+
+HASH_MAX_WORKERS = int(os.getenv("HASH_MAX_WORKERS", "2"))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "16"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "2"))  # seconds, sent in Retry-After
+
+
+class HashPoolFull(Exception):
+    """Raised when the hashing queue is full; maps to 503 + Retry-After."""
+
+
+_executor = ThreadPoolExecutor(max_workers=HASH_MAX_WORKERS, thread_name_prefix="pwhash")
+_lock = threading.Lock()
+_in_flight = 0
+_metrics = {
+    "submitted": 0,
+    "completed": 0,
+    "rejected": 0,
+    "total_hash_seconds": 0.0,
+    "max_hash_seconds": 0.0,
+    "total_wait_seconds": 0.0,
+}
+
+
+def _run(fn, args, queued_at):
+    global _in_flight
+    started = time.monotonic()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.monotonic() - started
+        with _lock:
+            _in_flight -= 1
+            _metrics["completed"] += 1
+            _metrics["total_hash_seconds"] += elapsed
+            _metrics["max_hash_seconds"] = max(_metrics["max_hash_seconds"], elapsed)
+            _metrics["total_wait_seconds"] += started - queued_at
+
+
+def _submit(fn, *args):
+    global _in_flight
+    with _lock:
+        if _in_flight >= HASH_MAX_WORKERS + HASH_MAX_QUEUE:
+            _metrics["rejected"] += 1
+            raise HashPoolFull("Password hashing queue is full")
+        _in_flight += 1
+        _metrics["submitted"] += 1
+    try:
+        future = _executor.submit(_run, fn, args, time.monotonic())
+    except Exception:
+        with _lock:
+            _in_flight -= 1
+        raise
+    return future.result()
+
+
+def checkpw(password, stored):
+    return _submit(ripbcrypt.checkpw, password, stored)
+
+
+def hashpw(password):
+    return _submit(ripbcrypt.hashpw, password, ripbcrypt.gensalt())
+
+
+def stats():
+    with _lock:
+        data = dict(_metrics)
+        data["in_flight"] = _in_flight
+    done = data["completed"] or 1
+    data["avg_hash_seconds"] = data["total_hash_seconds"] / done
+    data["avg_wait_seconds"] = data["total_wait_seconds"] / done
+    data["max_workers"] = HASH_MAX_WORKERS
+    data["max_queue"] = HASH_MAX_QUEUE
+    return data
+
+
+def busy_response():
+    response = jsonify({"message": "Server is busy, please try again shortly."})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(HASH_RETRY_AFTER)
+    return response
+
+
+def init_app(app):
+    app.register_error_handler(HashPoolFull, lambda e: busy_response())
@@ -0,0 +1,56 @@
+# -------------------------
+# Ticket and account IDs without read-before-insert probing.
+# IDs come from a Postgres sequence, run through a keyed Feistel permutation
+# of 1..9999999999 so they still look random (and are not guessable in order).
+# The permutation is a bijection, so two sequence values never give the same
+# ID; the whole allocation happens inside the INSERT itself.
+# Formats are unchanged: ticket IDs are plain numbers, user IDs are 10-digit
+# zero-padded strings.
+# Sequences and obfuscate_id() are created by migrations/0002.
+# NOTE: the round keys below must never change once IDs have been issued.
+# -------------------------
+
+MAX_ATTEMPTS = 5  # only relevant if a new ID hits a legacy random ID
+
+TICKET_KEYS = (48611, 90023, 17257, 63781)
+ACCOUNT_KEYS = (27449, 81239, 55903, 3691)
+
+_HALF = 100000          # the 10-digit domain is split into two 5-digit halves
+_MULT = 2654435761
+_MOD = 4294967291
+
+
+def _keys_sql(keys):
+    return "ARRAY[" + ", ".join(str(k) for k in keys) + "]::bigint[]"
+
+
+# SQL expressions that allocate a new ID; use them as the ID value in an INSERT
+TICKET_ID_SQL = f"obfuscate_id(nextval('ticket_public_id_seq'), {_keys_sql(TICKET_KEYS)})"
+USER_ID_SQL = f"lpad(obfuscate_id(nextval('account_public_id_seq'), {_keys_sql(ACCOUNT_KEYS)})::text, 10, '0')"
+
+
+def obfuscate(n, keys):
+    """Python twin of obfuscate_id(), for checks and one-off scripts."""
+    while True:
+        left, right = divmod(n, _HALF)
+        for k in keys:
+            left, right = right, (left + (((right ^ k) * _MULT) % _MOD) % _HALF) % _HALF
+        n = left * _HALF + right
+        if n != 0:
+            return n
+
+
+def insert_returning_id(cursor, sql, params):
+    """
+    Run an INSERT that allocates its own ID and ends in
+    ON CONFLICT (<id column>) DO NOTHING RETURNING <id column>.
+    Returns the new ID. A conflict can only come from an ID issued by the old
+    random scheme, so the insert is simply repeated with the next value.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        if row is not None:
+            return row[0] if not isinstance(row, dict) else next(iter(row.values()))
+    raise RuntimeError(f"Could not allocate a free ID after {MAX_ATTEMPTS} attempts")
+
@@ -0,0 +1,172 @@
+import os
+import re
+import sys
+import psycopg2
+from dotenv import load_dotenv
+
+# -------------------------
+# Versioned SQL migrations.
+# Files in migrations/ are named NNNN_description.sql and applied once, in
+# order; applied versions are recorded in schema_migrations. A file whose
+# first line is "-- migrate: no-transaction" runs statement by statement in
+# autocommit (needed for CREATE INDEX CONCURRENTLY), everything else runs in
+# one transaction. An advisory lock keeps concurrent app starts from racing.
+#
+#   python migrate.py            apply pending migrations
+#   python migrate.py status     list applied / pending versions
+# -------------------------
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+LOCK_ID = 720_394_118  # pg_advisory_lock key for this app's migrations
+
+_FILENAME = re.compile(r"^(\d{4})_([\w\-]+)\.sql$")
+_NO_TRANSACTION = "-- migrate: no-transaction"
+_CONCURRENT_INDEX = re.compile(
+    r"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.I)
+
+
+class MigrationError(RuntimeError):
+    """A migration could not be applied; the app must not start on that schema."""
+
+
+def _connect():
+    # Direct connection: DDL wants autocommit control, which the pool proxy hides
+    return psycopg2.connect(os.getenv("DATABASE_URL"), sslmode="require")
+
+
+def available():
+    """[(version, name, path)] for every migration file, in order."""
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        m = _FILENAME.match(filename)
+        if m:
+            found.append((m.group(1), m.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return found
+
+
+def _statements(sql):
+    """Split a no-transaction file on ';' at line end (such files hold no $$ bodies)."""
+    body = "\n".join(line for line in sql.splitlines() if not line.strip().startswith("--"))
+    return [s.strip() for s in re.split(r";\s*$", body, flags=re.M) if s.strip()]
+
+
+def _index_is_invalid(cursor, name):
+    """True if index `name` exists but is INVALID (left by a failed CONCURRENTLY build)."""
+    cursor.execute("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+    """, (name,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def _run_no_transaction(cursor, statement):
+    """
+    Run one autocommit statement. A failed CREATE INDEX CONCURRENTLY leaves an
+    INVALID index behind that IF NOT EXISTS would accept on the next run, so
+    such leftovers are dropped first and every build is verified afterwards.
+    """
+    m = _CONCURRENT_INDEX.match(statement)
+    if m and _index_is_invalid(cursor, m.group(1)):
+        print(f"Dropping invalid index {m.group(1)} left by an earlier failed build")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {m.group(1)}")
+    cursor.execute(statement)
+    if m and _index_is_invalid(cursor, m.group(1)):
+        raise MigrationError(f"Index {m.group(1)} was built but is INVALID")
+
+
+def _applied(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    text PRIMARY KEY,
+            name       text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply(connect=_connect, verbose=True):
+    """Apply every pending migration; returns the versions applied."""
+    conn = connect()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    done = []
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (LOCK_ID,))
+        try:
+            applied = _applied(cursor)
+            for version, name, path in available():
+                if version in applied:
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    sql = f.read()
+                if verbose:
+                    print(f"Applying migration {version}_{name}")
+                if sql.lstrip().startswith(_NO_TRANSACTION):
+                    for statement in _statements(sql):
+                        _run_no_transaction(cursor, statement)
+                    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                                   (version, name))
+                else:
+                    conn.autocommit = False
+                    try:
+                        cursor.execute(sql)
+                        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                                       (version, name))
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    finally:
+                        conn.autocommit = True
+                done.append(version)
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+    finally:
+        cursor.close()
+        conn.close()
+    return done
+
+
+def status(connect=_connect):
+    """[(version, name, applied?)]"""
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        applied = _applied(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    return [(version, name, version in applied) for version, name, _ in available()]
+
+
+def init_app(app):
+    """
+    Bring the schema up to date at startup (AUTO_MIGRATE=0 to leave it to
+    deploys). A failed migration stops the app instead of booting it on a
+    half-migrated schema.
+    """
+    if not AUTO_MIGRATE:
+        return
+    try:
+        apply()
+    except Exception as e:
+        app.logger.critical("Migrations failed, refusing to start: %s", e)
+        raise MigrationError(f"Migrations failed: {e}") from e
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        for version, name, is_applied in status():
+            print(f"{version}_{name}: {'applied' if is_applied else 'pending'}")
+    else:
+        versions = apply()
+        print(f"Applied {len(versions)} migration(s)")
@@ -0,0 +1,15 @@
+-- Attachment storage state and the deferred upload queue (see upload_queue.py).
+-- storage_status: 'stored' | 'pending' | 'fallback' | 'failed'
+ALTER TABLE ticket_attachments
+    ADD COLUMN IF NOT EXISTS storage_status text NOT NULL DEFAULT 'stored';
+
+CREATE TABLE IF NOT EXISTS attachment_upload_queue (
+    attachment_id   bigint PRIMARY KEY,
+    spool_host      text NOT NULL,
+    spool_path      text NOT NULL,
+    storage_path    text NOT NULL,
+    mime_type       text,
+    attempts        integer NOT NULL DEFAULT 0,
+    last_error      text,
+    next_attempt_at timestamptz NOT NULL DEFAULT now()
+);
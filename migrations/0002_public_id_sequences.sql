@@ -0,0 +1,28 @@
+-- Ticket / account ID allocation (see id_allocator.py).
+-- obfuscate_id() is a keyed Feistel permutation of 1..9999999999; the keys are
+-- passed in by id_allocator and must never change once IDs have been issued.
+CREATE SEQUENCE IF NOT EXISTS ticket_public_id_seq MINVALUE 1 MAXVALUE 9999999999 NO CYCLE;
+CREATE SEQUENCE IF NOT EXISTS account_public_id_seq MINVALUE 1 MAXVALUE 9999999999 NO CYCLE;
+
+CREATE OR REPLACE FUNCTION obfuscate_id(n bigint, keys bigint[]) RETURNS bigint
+LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+DECLARE
+    l bigint;
+    r bigint;
+    t bigint;
+    k bigint;
+BEGIN
+    LOOP
+        l := n / 100000;
+        r := n % 100000;
+        FOREACH k IN ARRAY keys LOOP
+            t := r;
+            r := (l + ((((r # k) * 2654435761) % 4294967291) % 100000)) % 100000;
+            l := t;
+        END LOOP;
+        n := l * 100000 + r;
+        -- 0 is not a valid ID: walk the cycle once more (terminates, inputs are >= 1)
+        EXIT WHEN n <> 0;
+    END LOOP;
+    RETURN n;
+END $$;
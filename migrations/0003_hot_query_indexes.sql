@@ -0,0 +1,44 @@
+-- migrate: no-transaction
+-- Indexes for the hot access paths; built CONCURRENTLY so writes keep flowing.
+-- Predicates of the partial indexes are written exactly like the queries'
+-- WHERE clauses so the planner can match them. Checked by query_plans.py.
+
+-- User dashboard: tickets WHERE reporter_id = ? ORDER BY created_date/last_update DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_reporter_created_idx
+    ON tickets (reporter_id, created_date DESC, ticket_id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_reporter_updated_idx
+    ON tickets (reporter_id, last_update DESC, ticket_id DESC);
+
+-- Staff dashboard and assignment counts: open tickets of one assignee
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_assigner_open_created_idx
+    ON tickets (assigner_id, created_date DESC, ticket_id DESC)
+    WHERE status NOT IN ('Closed');
+
+-- Mod dashboard: every ticket, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_created_idx
+    ON tickets (created_date DESC, ticket_id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_updated_idx
+    ON tickets (last_update DESC, ticket_id DESC);
+
+-- Ticket detail / attachment lists / download-all
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ticket_attachments_ticket_uploaded_idx
+    ON ticket_attachments (ticket_id, upload_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ticket_attachments_fallback_idx
+    ON ticket_attachments (id)
+    WHERE storage_status = 'fallback';
+
+-- Transaction history filtered by ticket or actor, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS transaction_history_ticket_idx
+    ON transaction_history (ticket_id, transaction_id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS transaction_history_action_by_idx
+    ON transaction_history (action_by, transaction_id DESC);
+
+-- Matching staff: staff accounts, their specialities
+CREATE INDEX CONCURRENTLY IF NOT EXISTS accounts_role_idx
+    ON "Accounts" (role, user_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS staffspeciality_user_idx
+    ON staffspeciality (user_id);
+
+-- Deferred upload workers: due jobs per host
+CREATE INDEX CONCURRENTLY IF NOT EXISTS attachment_upload_queue_due_idx
+    ON attachment_upload_queue (spool_host, next_attempt_at);
@@ -0,0 +1,62 @@
+-- Per-status ticket counts and per-role account counts, kept current by
+-- triggers (see dashboard_counters.py). NULL status/role is stored as ''.
+CREATE TABLE IF NOT EXISTS dashboard_counters (
+    kind  text   NOT NULL,          -- 'ticket_status' | 'account_role'
+    key   text   NOT NULL,
+    count bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, key)
+);
+
+CREATE OR REPLACE FUNCTION bump_dashboard_counter(p_kind text, p_key text, p_delta bigint) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO dashboard_counters (kind, key, count)
+    VALUES (p_kind, COALESCE(p_key, ''), p_delta)
+    ON CONFLICT (kind, key) DO UPDATE SET count = dashboard_counters.count + EXCLUDED.count;
+$$;
+
+CREATE OR REPLACE FUNCTION tickets_status_counter() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status::text IS NOT DISTINCT FROM NEW.status::text THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_dashboard_counter('ticket_status', OLD.status::text, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_dashboard_counter('ticket_status', NEW.status::text, 1);
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION accounts_role_counter() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.role::text IS NOT DISTINCT FROM NEW.role::text THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_dashboard_counter('account_role', OLD.role::text, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_dashboard_counter('account_role', NEW.role::text, 1);
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS tickets_status_counter ON tickets;
+CREATE TRIGGER tickets_status_counter
+    AFTER INSERT OR DELETE OR UPDATE OF status ON tickets
+    FOR EACH ROW EXECUTE FUNCTION tickets_status_counter();
+
+DROP TRIGGER IF EXISTS accounts_role_counter ON "Accounts";
+CREATE TRIGGER accounts_role_counter
+    AFTER INSERT OR DELETE OR UPDATE OF role ON "Accounts"
+    FOR EACH ROW EXECUTE FUNCTION accounts_role_counter();
+
+-- Backfill; the trigger DDL above holds off concurrent writes until commit
+DELETE FROM dashboard_counters WHERE kind IN ('ticket_status', 'account_role');
+INSERT INTO dashboard_counters (kind, key, count)
+    SELECT 'ticket_status', COALESCE(status::text, ''), COUNT(*) FROM tickets GROUP BY 2;
+INSERT INTO dashboard_counters (kind, key, count)
+    SELECT 'account_role', COALESCE(role::text, ''), COUNT(*) FROM "Accounts" GROUP BY 2;
@@ -0,0 +1,46 @@
+-- Open (not Closed) tickets currently assigned to each staff member, kept
+-- current by a trigger on tickets (see staff_workload.py). Covers assign,
+-- reassign, unassign, resolve/close and reopen on every write path.
+CREATE TABLE IF NOT EXISTS staff_workload (
+    user_id    text    PRIMARY KEY,
+    open_count integer NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_staff_workload(p_user_id text, p_delta integer) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO staff_workload (user_id, open_count)
+    VALUES (p_user_id, p_delta)
+    ON CONFLICT (user_id) DO UPDATE SET open_count = staff_workload.open_count + EXCLUDED.open_count;
+$$;
+
+CREATE OR REPLACE FUNCTION tickets_staff_workload() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    old_open boolean := TG_OP IN ('UPDATE', 'DELETE')
+                        AND OLD.assigner_id IS NOT NULL AND COALESCE(OLD.status::text <> 'Closed', false);
+    new_open boolean := TG_OP IN ('INSERT', 'UPDATE')
+                        AND NEW.assigner_id IS NOT NULL AND COALESCE(NEW.status::text <> 'Closed', false);
+BEGIN
+    IF old_open AND new_open AND OLD.assigner_id::text = NEW.assigner_id::text THEN
+        RETURN NULL;
+    END IF;
+    IF old_open THEN
+        PERFORM bump_staff_workload(OLD.assigner_id::text, -1);
+    END IF;
+    IF new_open THEN
+        PERFORM bump_staff_workload(NEW.assigner_id::text, 1);
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS tickets_staff_workload ON tickets;
+CREATE TRIGGER tickets_staff_workload
+    AFTER INSERT OR DELETE OR UPDATE OF status, assigner_id ON tickets
+    FOR EACH ROW EXECUTE FUNCTION tickets_staff_workload();
+
+-- Backfill; the trigger DDL above holds off concurrent writes until commit
+DELETE FROM staff_workload;
+INSERT INTO staff_workload (user_id, open_count)
+    SELECT assigner_id::text, COUNT(*) FROM tickets
+    WHERE assigner_id IS NOT NULL AND status::text <> 'Closed'
+    GROUP BY 1;
@@ -0,0 +1,27 @@
+-- Normalized speciality catalogue (see skill_index.py). staffspeciality keeps
+-- its speciality text column for readers, and gains the catalogue ID that
+-- matching uses for exact lookups.
+CREATE TABLE IF NOT EXISTS specialities (
+    speciality_id serial PRIMARY KEY,
+    name          text   NOT NULL UNIQUE
+);
+
+-- The ticket types offered by the UI, then anything already stored
+INSERT INTO specialities (name) VALUES
+    ('Software'), ('Hardware'), ('Network/Connectivity'), ('Account/Access'),
+    ('Security'), ('File/Storage'), ('Service Request')
+ON CONFLICT (name) DO NOTHING;
+INSERT INTO specialities (name)
+    SELECT DISTINCT btrim(speciality) FROM staffspeciality
+    WHERE btrim(COALESCE(speciality, '')) <> ''
+ON CONFLICT (name) DO NOTHING;
+
+ALTER TABLE staffspeciality
+    ADD COLUMN IF NOT EXISTS speciality_id integer REFERENCES specialities (speciality_id);
+UPDATE staffspeciality s
+SET speciality_id = c.speciality_id
+FROM specialities c
+WHERE c.name = btrim(s.speciality) AND s.speciality_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS staffspeciality_speciality_id_idx
+    ON staffspeciality (speciality_id, user_id);
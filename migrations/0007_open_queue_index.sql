@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Backlog of open, unassigned tickets, read by the staff claim queue
+-- (work_queue.py) and the batch auto-assigner (auto_assign.py).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_open_unassigned_idx
+    ON tickets (created_date, ticket_id)
+    WHERE status = 'Open' AND assigner_id IS NULL;
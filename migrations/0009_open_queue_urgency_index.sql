@@ -0,0 +1,20 @@
+-- migrate: no-transaction
+-- The claim queue and the auto-assigner read open, unassigned tickets most
+-- urgent first (auto_assign.URGENCY_RANK_SQL), then oldest. 0007 indexed
+-- only (created_date, ticket_id), so every claim still read and sorted the
+-- whole backlog. Leading with the same CASE expression lets the planner walk
+-- the index in claim order and stop at the first unlocked match.
+-- The expression must stay identical to URGENCY_RANK_SQL or the index is
+-- not used for the ORDER BY.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tickets_open_queue_idx
+    ON tickets ((CASE urgency
+                     WHEN 'Critical' THEN 0
+                     WHEN 'High' THEN 1
+                     WHEN 'Medium' THEN 2
+                     WHEN 'Low' THEN 3
+                     ELSE 4
+                 END), created_date, ticket_id)
+    WHERE status = 'Open' AND assigner_id IS NULL;
+
+DROP INDEX CONCURRENTLY IF EXISTS tickets_open_unassigned_idx;
@@ -1,26 +1,22 @@
-import os
 from datetime import datetime,timezone
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash,jsonify,send_file
-from zoneinfo import ZoneInfo
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash,jsonify
 from dotenv import load_dotenv
 import psycopg2
 import psycopg2.extras
-import supabase
-import zipfile
-import io
-import ripbcrypt
-from supabase import create_client
-import re
-import uuid
+from db_pool import get_db_connection
+import attachment_zip
+import transaction_history
+import ticket_list
+import ticket_detail
+import conditional_get
+import ref_cache
+import staff_workload
+import auto_assign
+from query_args import BadQuery, int_arg
+import hash_pool
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 mod_bp = Blueprint('mod', __name__, url_prefix='/mod')
 
-# Database connection function
-def get_db_connection():
-    return psycopg2.connect(os.getenv("DATABASE_URL"), sslmode="require")
 
 @mod_bp.route("/main", methods=["GET"])
 def mod_main():
@@ -33,34 +29,36 @@ def mod_main():
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     
     try:
-        # Fetch ALL tickets for this user
-        cursor.execute("""
-            SELECT 
-                t.ticket_id, t.title, t.description, t.status, 
-                t.created_date, t.last_update, 
-                t.type, t.urgency
-            FROM tickets t
-            ORDER BY t.created_date DESC
-        """)
-        tickets = cursor.fetchall()
-
-        bangkok = ZoneInfo("Asia/Bangkok")
-        for t in tickets:
-            if t["created_date"]:
-                t["created_date"] = t["created_date"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
-            if t["last_update"]:
-                t["last_update"] = t["last_update"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
+        # First page only; filters / further pages come from /mod/api/tickets
+        page = ticket_list.fetch_page(cursor, {}, "Mod", session["user_id"])
 
         return render_template(
             "mod_main.html",
-            tickets=tickets,
+            tickets=page["tickets"],
+            next_cursor=page["next_cursor"],
             username=session.get('username')
         )
     finally:
         cursor.close()
         conn.close()
 
-from flask import jsonify  # Add this import at the top
+@mod_bp.route('/api/tickets', methods=['GET'])
+def api_list_tickets():
+    if "user_id" not in session or session.get("role") != "Mod":
+        return jsonify({"message": "Unauthorized"}), 401
+
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        page = ticket_list.fetch_page(cursor, request.args, "Mod", session["user_id"])
+        return conditional_get.json_page(page)
+    except ticket_list.BadQuery as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"Error fetching tickets: {str(e)}"}), 500
+    finally:
+        cursor.close()
+        conn.close()
 
 # Add these API endpoints to mod_main_core.py
 
@@ -100,10 +98,7 @@ def api_assign_ticket(ticket_id):
 
         # Log the transaction
         details = f'Ticket assigned to staff: {staff["username"]} (ID: {staff_id})'
-        cursor.execute("""
-            INSERT INTO transaction_history (ticket_id, action_type, action_by, action_time, detail)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (ticket_id, 'assign', session["user_id"], now, details))
+        transaction_history.record(cursor, (ticket_id, 'assign', session["user_id"], now, details))
 
         conn.commit()
         return jsonify({"message": f"Ticket assigned to {staff['username']} successfully!"}), 200
@@ -115,6 +110,50 @@ def api_assign_ticket(ticket_id):
         cursor.close()
         conn.close()
 
+@mod_bp.route('/api/tickets/auto_assign', methods=['POST'])
+def api_auto_assign():
+    if "user_id" not in session or session.get("role") != "Mod":
+        return jsonify({"message": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"message": "Request body must be a JSON object"}), 400
+    # Only a real JSON boolean: bool("false") would silently commit a run
+    dry_run = data.get('dry_run', False)
+    if not isinstance(dry_run, bool):
+        return jsonify({"message": "'dry_run' must be true or false"}), 400
+    try:
+        capacity = int_arg(data, 'capacity')
+        limit = int_arg(data, 'limit')
+    except BadQuery as e:
+        return jsonify({"message": str(e)}), 400
+    if capacity is None:
+        capacity = auto_assign.AUTO_ASSIGN_CAPACITY
+    if limit is None:
+        limit = auto_assign.AUTO_ASSIGN_BATCH
+    if capacity < 1 or limit < 1:
+        return jsonify({"message": "'capacity' and 'limit' must be at least 1"}), 400
+    # One request never locks more than a scheduled batch would
+    limit = min(limit, auto_assign.AUTO_ASSIGN_BATCH)
+
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    try:
+        result = auto_assign.assign_batch(cursor, session["user_id"], dry_run, capacity, limit)
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        return jsonify(result), 200
+
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"message": f"Auto-assignment failed: {str(e)}"}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
 @mod_bp.route('/api/tickets/<ticket_id>/status', methods=['POST'])
 def api_change_status(ticket_id):
     if "user_id" not in session or session.get("role") != "Mod":
@@ -164,10 +203,7 @@ def api_change_status(ticket_id):
             return jsonify({"message": "Ticket not found or status change not allowed"}), 400
 
         # Log the transaction
-        cursor.execute("""
-            INSERT INTO transaction_history (ticket_id, action_type, action_by, action_time, detail)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (ticket_id, 'status_change', mod_id, now, f'Status changed to {new_status} by Mod'))
+        transaction_history.record(cursor, (ticket_id, 'status_change', mod_id, now, f'Status changed to {new_status} by Mod'))
 
         conn.commit()
         
@@ -192,54 +228,10 @@ def download_all_attachments(ticket_id):
     if "user_id" not in session:
         return jsonify({"message": "Unauthorized"}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
     try:
-        cursor.execute("""
-            SELECT id, filename, mime_type, filedata, file_url
-            FROM ticket_attachments
-            WHERE ticket_id = %s
-        """, (ticket_id,))
-        attachments = cursor.fetchall()
-
-        if not attachments:
-            return jsonify({"message": "No attachments found"}), 404
-
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for att in attachments:
-                if att["filedata"]:  # Inline in DB
-                    zipf.writestr(att["filename"], att["filedata"])
-                elif att["file_url"]:  # Stored in Supabase
-                      try:
-                           bucket_name, file_path = extract_bucket_and_path(att["file_url"])
-        
-                           # Download file from Supabase
-                           res = supabase.storage.from_(bucket_name).download(file_path)
-                           if res is not None:
-                               zipf.writestr(att["filename"], res)
-                           else:
-                                 zipf.writestr(att["filename"] + ".url.txt", 
-                                    f"File could not be retrieved. Original URL: {att['file_url']}")
-                      except Exception as e:
-                               zipf.writestr(att["filename"] + ".error.txt", 
-                                f"Error downloading file: {str(e)}")
-
-        zip_buffer.seek(0)
-
-        return send_file(
-            zip_buffer,
-            mimetype="application/zip",
-            as_attachment=True,
-            download_name=f"ticket_{ticket_id}_attachments.zip"
-        )
-
+        return attachment_zip.download_all_response(ticket_id)
     except Exception as e:
         return jsonify({"message": f"Download failed: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 @mod_bp.route('/api/tickets/<ticket_id>/staff', methods=['GET'])
@@ -260,39 +252,20 @@ def api_get_matching_staff(ticket_id):
 
         ticket_type = ticket['type']
 
-        # If type is "Other" -> fetch ALL staff
+        # Specialities come from the in-memory skill index, so only the workload lookup hits the DB
+        index = ref_cache.staff_index(cursor)
+
+        # If type is "Other" -> ALL staff, otherwise staff with exactly that speciality
         if ticket_type.lower() == "other":
-            cursor.execute("""
-                SELECT a.user_id,
-                       a.username,
-                       STRING_AGG(DISTINCT s.speciality, ', ') AS specialties,
-                       COUNT(DISTINCT t2.ticket_id) AS current_assignment_count
-                FROM "Accounts" a
-                LEFT JOIN staffspeciality s ON a.user_id = s.user_id
-                LEFT JOIN tickets t2 ON a.user_id = t2.assigner_id 
-                    AND t2.status NOT IN ('Closed')
-                WHERE a.role = 'Staff'
-                GROUP BY a.user_id, a.username
-                ORDER BY current_assignment_count ASC
-            """)
+            candidates = None
         else:
-            # Otherwise filter staff by the ticket type
-            cursor.execute("""
-                SELECT a.user_id,
-                       a.username,
-                       STRING_AGG(DISTINCT s.speciality, ', ') AS specialties,
-                       COUNT(DISTINCT t2.ticket_id) AS current_assignment_count
-                FROM "Accounts" a
-                JOIN staffspeciality s ON a.user_id = s.user_id
-                LEFT JOIN tickets t2 ON a.user_id = t2.assigner_id 
-                    AND t2.status NOT IN ('Closed')
-                WHERE a.role = 'Staff'
-                  AND s.speciality LIKE CONCAT('%%', %s, '%%')
-                GROUP BY a.user_id, a.username
-                ORDER BY current_assignment_count ASC
-            """, (ticket_type,))
-
-        staff = cursor.fetchall()
+            candidates = sorted(index.candidates(ticket_type))
+
+        # Least loaded first, from the trigger-maintained open-assignment counters
+        staff = staff_workload.workloads(cursor, candidates)
+        for member in staff:
+            specs = index.specialities_of(member["user_id"])
+            member["specialties"] = ", ".join(specs) if specs else None
 
         return jsonify(staff), 200
 
@@ -336,25 +309,10 @@ def api_get_transactions():
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
-        cursor.execute("""
-            SELECT th.transaction_id,
-                   th.ticket_id,
-                   th.action_type,
-                   th.action_by      AS action_by_id,
-                   a.username        AS action_by_username,
-                   th.action_time,
-                   th.detail
-            FROM transaction_history th
-            LEFT JOIN "Accounts" a ON th.action_by = a.user_id
-            ORDER BY transaction_id DESC
-        """)
-        transactions = cursor.fetchall()
-
-        bangkok = ZoneInfo("Asia/Bangkok")
-        for t in transactions:
-            if t["action_time"]:
-                t["action_time"] = t["action_time"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
-        return jsonify(transactions), 200
+        page = transaction_history.fetch_page(cursor, request.args)
+        return jsonify(page), 200
+    except transaction_history.BadQuery as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": f"Error fetching transactions: {str(e)}"}), 500
     finally:
@@ -403,10 +361,7 @@ def api_update_ticket(ticket_id):
         """, (client_message, dev_message, now, ticket_id))  # Only 4 parameters
         
         # Log the transaction
-        cursor.execute("""
-            INSERT INTO transaction_history (ticket_id, action_type, action_by, action_time, detail)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (ticket_id, 'update', mod_id, now, 'Mod updated ticket messages'))
+        transaction_history.record(cursor, (ticket_id, 'update', mod_id, now, 'Mod updated ticket messages'))
 
         conn.commit()
         return jsonify({"message": "Updates saved successfully!"}), 200
@@ -463,10 +418,7 @@ def api_update_ticket2(ticket_id):
             
             # Log the transaction
             detail = f"Mod updated ticket: type to '{new_type}', urgency to '{new_urgency}'"
-            cursor.execute("""
-                INSERT INTO transaction_history (ticket_id, action_type, action_by, action_time, detail)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (ticket_id, 'type_urgency_update', mod_id, now, detail))
+            transaction_history.record(cursor, (ticket_id, 'type_urgency_update', mod_id, now, detail))
 
             conn.commit()
             return jsonify({"message": "Type/Urgency updated successfully!"}), 200
@@ -505,7 +457,7 @@ def update_account():
             return redirect(url_for('user.user_dashboard'))
         
         # Verify current password with bcrypt
-        if not ripbcrypt.checkpw(current_password, user['password_hash']):
+        if not hash_pool.checkpw(current_password, user['password_hash']):
             flash("Current password is incorrect", "error")
             return redirect(url_for('user.user_dashboard'))
         
@@ -518,13 +470,16 @@ def update_account():
         
         # Update password if provided
         if new_password:
-            hashed_pw = ripbcrypt.hashpw(new_password, ripbcrypt.gensalt())
+            hashed_pw = hash_pool.hashpw(new_password)
             cursor.execute('UPDATE "Accounts" SET password_hash = %s WHERE user_id = %s', 
                           (hashed_pw, user_id))
             flash("Password updated successfully", "success")
         
         conn.commit()
         
+    except hash_pool.HashPoolFull:
+        conn.rollback()
+        return hash_pool.busy_response()
     except Exception as e:
         conn.rollback()
         flash(f"Error updating account: {str(e)}", "error")
@@ -543,68 +498,19 @@ def api_get_ticket(ticket_id):
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
-        # Fetch ticket information - REMOVE the assigner_id restriction
-        cursor.execute("""
-            SELECT t.*, 
-                   ra.username AS reporter_username,
-                   ra.email AS user_email,
-                   ra.contact_number AS user_number,
-                   aa.username AS assigner_username,
-                   aa.email AS staff_email,
-                   aa.contact_number AS staff_number
-            FROM tickets t
-            JOIN "Accounts" ra ON t.reporter_id = ra.user_id
-            LEFT JOIN "Accounts" aa ON t.assigner_id = aa.user_id
-            WHERE t.ticket_id = %s
-        """, (ticket_id,))  # Only one parameter now
-        ticket = cursor.fetchone()
+        # Cheap validator check first; unchanged tickets skip the full query
+        validators = ticket_detail.validators(conn, cursor, ticket_id, "Mod", session.get("user_id"))
+        if not validators:
+            return jsonify({"message": "Ticket not found"}), 404
+        cached = conditional_get.not_modified(*validators)
+        if cached:
+            return cached
 
+        ticket = ticket_detail.fetch(conn, cursor, ticket_id, "Mod", session.get("user_id"))
         if not ticket:
             return jsonify({"message": "Ticket not found"}), 404
 
-        # Fetch attachments for this ticket
-        cursor.execute("""
-            SELECT filename, mime_type, upload_date
-            FROM ticket_attachments
-            WHERE ticket_id = %s
-            ORDER BY upload_date DESC
-        """, (ticket_id,))
-        attachments = cursor.fetchall()
-        bangkok = ZoneInfo("Asia/Bangkok")
-        created_date = ticket["created_date"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M") if ticket["created_date"] else None
-        last_update = ticket["last_update"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M") if ticket["last_update"] else None
-
-        attachments_data = []
-        for att in attachments:
-            upload_date = att["upload_date"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M") if att["upload_date"] else None
-            attachments_data.append({
-                "filename": att["filename"],
-                "filetype": att["mime_type"],
-                "upload_date": upload_date
-            })
-        # Format the response
-        ticket_data = {
-            "id": ticket["ticket_id"],
-            "title": ticket["title"],
-            "description": ticket["description"],
-            "status": ticket["status"],
-            "type": ticket["type"],
-            "urgency": ticket["urgency"],
-            "created_date": created_date,
-            "last_update": last_update,
-            "reporter_username": ticket["reporter_username"],
-            "user_email": ticket["user_email"],
-            "user_number": ticket["user_number"],
-            "assigner_username": ticket["assigner_username"],
-            "staff_email": ticket["staff_email"],
-            "staff_number": ticket["staff_number"],
-            "client_messages": ticket.get("client_message",""),
-            "dev_messages": ticket.get("dev_message",""),
-            "attachments": attachments_data
-            
-        }
-
-        return jsonify(ticket_data)
+        return conditional_get.json_response(ticket_detail.to_response(ticket, "Mod"), *validators)
         
     except Exception as e:
         # Add error logging to help with debugging
@@ -613,46 +519,6 @@ def api_get_ticket(ticket_id):
     finally:
         cursor.close()
         conn.close()
-def extract_bucket_and_path(file_url):
-    """
-    Extract bucket name and file path from Supabase storage URL
-    Example URL: https://xyz.supabase.co/storage/v1/object/public/bucket-name/path/to/file
-    """
-    try:
-        # Remove the protocol and split by '/'
-        parts = file_url.replace("https://", "").replace("http://", "").split('/')
-        
-        # Find the index of 'object' which is part of the Supabase URL structure
-        try:
-            object_index = parts.index('object')
-        except ValueError:
-            # If 'object' is not found, try a different approach
-            # Look for 'storage' which is another common part
-            try:
-                storage_index = parts.index('storage')
-                # The bucket should be after 'public'
-                public_index = parts.index('public', storage_index)
-                if public_index + 1 < len(parts):
-                    bucket_name = parts[public_index + 1]
-                    file_path = '/'.join(parts[public_index + 2:])
-                    return bucket_name, file_path
-            except ValueError:
-                pass
-            
-            # If we can't parse the URL, return defaults
-            return "large_file_for_db", file_url.split('/public/')[-1] if '/public/' in file_url else ""
-        
-        # The bucket should be two parts after 'object'
-        if object_index + 3 < len(parts):
-            bucket_name = parts[object_index + 2]
-            file_path = '/'.join(parts[object_index + 3:])
-            return bucket_name, file_path
-        else:
-            return "large_file_for_db", file_url.split('/public/')[-1] if '/public/' in file_url else ""
-    except Exception as e:
-        print(f"Error parsing URL {file_url}: {str(e)}")
-        return "large_file_for_db", file_url.split('/public/')[-1] if '/public/' in file_url else ""
-
 @mod_bp.route('/api/tickets/<ticket_id>/attachments', methods=['GET'])
 def api_get_attachments(ticket_id):
     if "user_id" not in session or session.get("role") != "Mod":
@@ -662,7 +528,7 @@ def api_get_attachments(ticket_id):
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
         cursor.execute("""
-            SELECT id, filename, mime_type as file_type, upload_date
+            SELECT id, filename, mime_type as file_type, upload_date, storage_status
             FROM ticket_attachments
             WHERE ticket_id = %s
             ORDER BY upload_date DESC
@@ -0,0 +1,34 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# -------------------------
+# Small helpers for parsing list-API query strings (request.args).
+# -------------------------
+
+
+class BadQuery(ValueError):
+    """Raised for malformed query-string parameters (maps to 400)."""
+
+
+def int_arg(args, name):
+    value = args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):  # TypeError: a list / object in a JSON body
+        raise BadQuery(f"'{name}' must be an integer")
+
+
+def time_arg(args, name):
+    value = args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise BadQuery(f"'{name}' must be an ISO date/time")
+    if parsed.tzinfo is None:
+        # Dates typed in the UI are Bangkok local time
+        parsed = parsed.replace(tzinfo=ZoneInfo("Asia/Bangkok"))
+    return parsed
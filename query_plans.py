@@ -0,0 +1,113 @@
+import sys
+import psycopg2
+import psycopg2.extras
+import attachment_zip
+import auto_assign
+import db_pool
+import migrate
+import staff_workload
+import ticket_detail
+import ticket_list
+import transaction_history
+import upload_queue
+import work_queue
+
+# -------------------------
+# Plan regression check for the hot queries.
+# Each query is EXPLAINed with enable_seqscan off: when a usable index exists
+# the planner then always takes it, so any Seq Scan left in the plan means the
+# access path has no index, whatever the table size. Queue reads listed in
+# INDEX_ORDERED must also come out of the index already ordered. Checked by
+# tests/test_query_plans.py against a seeded database (TEST_DATABASE_URL), or
+# by hand against any migrated database:
+#
+#   python query_plans.py      exits 1 and lists the offenders
+# -------------------------
+
+SAMPLE_USER = "0000000001"
+SAMPLE_TICKET = "1"
+
+
+def _prepared(sql, params):
+    """A $1, $2 ... statement (see db_pool.execute_prepared) as (sql, params) for cursor.execute."""
+    return db_pool.pyformat(sql), {f"p{i}": value for i, value in enumerate(params, 1)}
+
+
+# name -> (sql, params); the statements themselves come from the modules that
+# run them, so a change there is checked here without copying anything
+HOT_QUERIES = {
+    "user dashboard": ticket_list.build_query({}, "User", SAMPLE_USER)[:2],
+    "staff dashboard": ticket_list.build_query({}, "Staff", SAMPLE_USER)[:2],
+    "mod dashboard": ticket_list.build_query({}, "Mod", SAMPLE_USER)[:2],
+    "mod dashboard by last update": ticket_list.build_query({"sort": "last_update"}, "Mod", SAMPLE_USER)[:2],
+    "ticket detail": _prepared(ticket_detail.SQL, (SAMPLE_TICKET, "User", SAMPLE_USER)),
+    "ticket validators": _prepared(ticket_detail.VALIDATORS_SQL, (SAMPLE_TICKET, "User", SAMPLE_USER)),
+    "transaction history": transaction_history.build_query({})[:2],
+    "transaction history by ticket": transaction_history.build_query({"ticket_id": SAMPLE_TICKET})[:2],
+    "zip storage attachments": (attachment_zip.EXTERNAL_SQL, (SAMPLE_TICKET,)),
+    "zip inline attachments": (attachment_zip.INLINE_SQL, (attachment_zip.BLOB_READ_SIZE, SAMPLE_TICKET)),
+    "staff workload": (staff_workload.WORKLOADS_SQL, ([SAMPLE_USER], [SAMPLE_USER])),
+    "open ticket queue": (auto_assign.OPEN_TICKETS_SQL, (auto_assign.AUTO_ASSIGN_BATCH,)),
+    "claim next ticket": (work_queue.CLAIM_SQL, (["Software"],)),
+    "fallback attachments": (upload_queue.FALLBACKS_SQL, (50,)),
+    "due upload jobs": (upload_queue.CLAIM_SQL, (upload_queue.LEASE_SECONDS, "host")),
+}
+
+
+# Queries that take the first few rows in index order; a Sort node means they
+# read and sort the whole matching set on every call
+INDEX_ORDERED = ("open ticket queue", "claim next ticket")
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def _plan(cursor, sql, params):
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    row = cursor.fetchone()
+    return (row["QUERY PLAN"] if isinstance(row, dict) else row[0])[0]["Plan"]
+
+
+def seq_scans(cursor, sql, params):
+    """Tables the plan of sql reads sequentially (enable_seqscan off for the transaction)."""
+    return [node.get("Relation Name") for node in _walk(_plan(cursor, sql, params))
+            if node.get("Node Type") == "Seq Scan"]
+
+
+def sorts(cursor, sql, params):
+    """True if the plan of sql sorts rows instead of reading them in index order."""
+    return any(node.get("Node Type") in ("Sort", "Incremental Sort")
+               for node in _walk(_plan(cursor, sql, params)))
+
+
+def check(connect=migrate._connect):
+    """{query name: [problems]} for every offending query."""
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    failures = {}
+    try:
+        for name, (sql, params) in HOT_QUERIES.items():
+            problems = [f"sequential scan on {table}" for table in seq_scans(cursor, sql, params)]
+            conn.rollback()
+            if name in INDEX_ORDERED and sorts(cursor, sql, params):
+                problems.append("sorts instead of reading in index order")
+            conn.rollback()
+            if problems:
+                failures[name] = problems
+    finally:
+        cursor.close()
+        conn.close()
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check()
+    for name, problems in failures.items():
+        print(f"FAIL {name}: {'; '.join(problems)}")
+    if failures:
+        sys.exit(1)
+    print(f"All {len(HOT_QUERIES)} hot queries use indexes")
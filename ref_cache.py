@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+import psycopg2.extras
+from db_pool import get_db_connection
+import skill_index
+
+# -------------------------
+# In-process read-through cache for reference data (the speciality index and
+# the like) that changes rarely but is read on every page / matching call.
+# Each set has a loader; get() serves it from memory until REF_CACHE_TTL
+# expires or an admin write calls invalidate(). Invalidation is per process,
+# so other workers pick the change up within one TTL at most.
+# -------------------------
+
+REF_CACHE_TTL = float(os.getenv("REF_CACHE_TTL", "300"))  # seconds
+
+
+class ReferenceCache:
+    def __init__(self, ttl=REF_CACHE_TTL):
+        self.ttl = ttl
+        self._loaders = {}
+        self._entries = {}       # name -> (value, loaded_at)
+        self._generation = {}    # bumped by invalidate(), guards in-flight loads
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._counters = {}
+
+    def register(self, name, loader):
+        """loader(cursor) -> value; the cursor is a RealDictCursor."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._generation.setdefault(name, 0)
+            self._load_locks.setdefault(name, threading.Lock())
+            self._counters.setdefault(name, {"hits": 0, "misses": 0, "invalidations": 0})
+
+    def _fresh(self, name):
+        entry = self._entries.get(name)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry
+        return None
+
+    def get(self, name, cursor=None):
+        """
+        Cached value of a reference set, loading it on a miss.
+        Pass the handler's RealDictCursor to load on its connection; without
+        one a pooled connection is borrowed for the load.
+        """
+        with self._lock:
+            entry = self._fresh(name)
+            if entry is not None:
+                self._counters[name]["hits"] += 1
+                return entry[0]
+        # One loader per set at a time; the others wait and reuse its result
+        with self._load_locks[name]:
+            with self._lock:
+                entry = self._fresh(name)
+                if entry is not None:
+                    self._counters[name]["hits"] += 1
+                    return entry[0]
+                self._counters[name]["misses"] += 1
+                generation = self._generation[name]
+            value = self._load(name, cursor)
+            with self._lock:
+                if self._generation[name] == generation:
+                    self._entries[name] = (value, time.monotonic())
+            return value
+
+    def _load(self, name, cursor):
+        if cursor is not None:
+            return self._loaders[name](cursor)
+        conn = get_db_connection()
+        own = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        try:
+            value = self._loaders[name](own)
+            conn.commit()
+            return value
+        finally:
+            own.close()
+            conn.close()
+
+    def invalidate(self, *names):
+        """Drop the given sets (all of them if none given); call after committing a write."""
+        with self._lock:
+            for name in names or tuple(self._loaders):
+                self._entries.pop(name, None)
+                self._generation[name] += 1
+                self._counters[name]["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            data = {}
+            for name, counters in self._counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                entry = self._entries.get(name)
+                data[name] = dict(counters,
+                                  hit_rate=counters["hits"] / lookups if lookups else 0.0,
+                                  age_seconds=time.monotonic() - entry[1] if entry else None)
+            return data
+
+
+# -------------------------
+# Reference sets
+# -------------------------
+
+cache = ReferenceCache()
+cache.register("skill_index", skill_index.load)
+
+
+def staff_index(cursor=None):
+    """Current skill_index.SkillIndex (speciality catalogue + speciality -> staff)."""
+    return cache.get("skill_index", cursor)
+
+
+def specialities_of(user_id, cursor=None):
+    return staff_index(cursor).specialities_of(user_id)
+
+
+def invalidate(*names):
+    cache.invalidate(*names)
+
+
+def stats():
+    return cache.stats()
+
+
+def init_app(app):
+    """Bulk-load every reference set at startup so first requests hit memory."""
+    for name in tuple(cache._loaders):
+        try:
+            cache.get(name)
+        except Exception as e:
+            print(f"Reference cache warm-up failed for {name}: {e}")
@@ -1,16 +1,25 @@
 import hashlib, hmac, os, base64
 
+# -------------------------
+# Current hashing policy.
+# Stored hashes weaker than this are upgraded on the next successful login.
+# -------------------------
+ALGORITHM = "pbkdf2_sha256"
+ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", "200000"))
+SALT_LENGTH = 16  # raw bytes before base64
+DKLEN = 32
+
 # -------------------------
 # bcrypt-like API (PBKDF2-SHA256 under the hood)
 # -------------------------
 
-def gensalt(length: int = 16) -> str:
+def gensalt(length: int = SALT_LENGTH) -> str:
     """
     Generate a random salt (base64-encoded).
     """
     return base64.b64encode(os.urandom(length)).decode("utf-8")
 
-def hashpw(password: str, salt: str, iterations: int = 200_000, dklen: int = 32) -> str:
+def hashpw(password: str, salt: str, iterations: int = ITERATIONS, dklen: int = DKLEN) -> str:
     """
     Hash a password with PBKDF2-HMAC-SHA256.
     Returns: "pbkdf2_sha256$<iterations>$<salt>$<hash>"
@@ -19,7 +28,7 @@ def hashpw(password: str, salt: str, iterations: int = 200_000, dklen: int = 32)
         password = password.encode("utf-8")
     salt_bytes = base64.b64decode(salt.encode("utf-8"))
     dk = hashlib.pbkdf2_hmac("sha256", password, salt_bytes, iterations, dklen=dklen)
-    return f"pbkdf2_sha256${iterations}${salt}${base64.b64encode(dk).decode('utf-8')}"
+    return f"{ALGORITHM}${iterations}${salt}${base64.b64encode(dk).decode('utf-8')}"
 
 def checkpw(password: str, stored: str) -> bool:
     """
@@ -28,7 +37,7 @@ def checkpw(password: str, stored: str) -> bool:
     """
     try:
         algo, iterations_str, salt, hash_b64 = stored.split("$")
-        if algo != "pbkdf2_sha256":
+        if algo != ALGORITHM:
             raise ValueError("Unsupported algorithm")
         iterations = int(iterations_str)
         expected = base64.b64decode(hash_b64.encode("utf-8"))
@@ -41,4 +50,25 @@ def checkpw(password: str, stored: str) -> bool:
     salt_bytes = base64.b64decode(salt.encode("utf-8"))
     candidate = hashlib.pbkdf2_hmac("sha256", password, salt_bytes, iterations, dklen=len(expected))
 
-    return hmac.compare_digest(candidate, expected)
\ No newline at end of file
+    return hmac.compare_digest(candidate, expected)
+
+def needs_rehash(stored: str) -> bool:
+    """
+    True when the stored hash was made with a weaker algorithm, fewer
+    iterations, a shorter salt or a shorter key than the current policy.
+    Unparseable hashes also need rehashing.
+    """
+    try:
+        algo, iterations_str, salt, hash_b64 = stored.split("$")
+        iterations = int(iterations_str)
+        salt_len = len(base64.b64decode(salt.encode("utf-8")))
+        hash_len = len(base64.b64decode(hash_b64.encode("utf-8")))
+    except Exception:
+        return True
+
+    return (
+        algo != ALGORITHM
+        or iterations < ITERATIONS
+        or salt_len < SALT_LENGTH
+        or hash_len < DKLEN
+    )
@@ -0,0 +1,70 @@
+# -------------------------
+# Speciality catalogue and the in-memory speciality -> staff index.
+# specialities (migrations/0006) gives every speciality an integer ID and
+# staffspeciality rows carry that ID. The index is built in one bulk read and
+# served through ref_cache (loaded at startup, invalidated by admin account
+# writes), so finding the candidates for a ticket type is a dict lookup on an
+# exact name -- no LIKE, no substring false positives.
+# -------------------------
+
+
+class SkillIndex:
+    """Immutable snapshot; a reload builds a new one."""
+
+    def __init__(self, catalogue, assignments):
+        # catalogue: [(speciality_id, name)]; assignments: [(user_id, speciality_id)]
+        self.names = dict(catalogue)
+        self.ids = {name: speciality_id for speciality_id, name in catalogue}
+        staff = {}
+        by_staff = {}
+        for user_id, speciality_id in assignments:
+            staff.setdefault(speciality_id, set()).add(user_id)
+            by_staff.setdefault(user_id, []).append(self.names[speciality_id])
+        self._staff = {speciality_id: frozenset(users) for speciality_id, users in staff.items()}
+        self._by_staff = {user_id: sorted(names) for user_id, names in by_staff.items()}
+
+    def speciality_id(self, name):
+        return self.ids.get(name)
+
+    def candidates(self, name):
+        """Staff user_ids with exactly this speciality (empty if unknown)."""
+        return self._staff.get(self.ids.get(name), frozenset())
+
+    def specialities_of(self, user_id):
+        return list(self._by_staff.get(user_id, []))
+
+
+def load(cursor):
+    """Bulk-load the index; cursor is a RealDictCursor."""
+    cursor.execute("SELECT speciality_id, name FROM specialities")
+    catalogue = [(row["speciality_id"], row["name"]) for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT user_id, speciality_id
+        FROM staffspeciality
+        WHERE speciality_id IS NOT NULL
+    """)
+    assignments = [(row["user_id"], row["speciality_id"]) for row in cursor.fetchall()]
+    return SkillIndex(catalogue, assignments)
+
+
+def resolve_ids(cursor, names):
+    """
+    {name: speciality_id} for the given speciality names, adding any that are
+    not in the catalogue yet. Works with plain and RealDict cursors.
+    """
+    names = sorted({name.strip() for name in names if name and name.strip()})
+    if not names:
+        return {}
+    cursor.execute("""
+        INSERT INTO specialities (name)
+        SELECT unnest(%s::text[])
+        ON CONFLICT (name) DO NOTHING
+    """, (names,))
+    cursor.execute("SELECT name, speciality_id FROM specialities WHERE name = ANY(%s::text[])", (names,))
+    return dict(tuple(row.values()) if isinstance(row, dict) else row for row in cursor.fetchall())
+
+
+def speciality_rows(cursor, user_id, names):
+    """staffspeciality rows (user_id, speciality, speciality_id) for an account."""
+    ids = resolve_ids(cursor, names)
+    return [(user_id, name, speciality_id) for name, speciality_id in ids.items()]
@@ -1,32 +1,23 @@
 from flask import Blueprint, render_template, request, session, redirect, url_for, flash,jsonify
 from zoneinfo import ZoneInfo
-import os
 from dotenv import load_dotenv
 from datetime import datetime , timezone
 import psycopg2
 import psycopg2.extras
-# Load environment variables
-from flask import send_file
-import io
-import supabase
-import zipfile
-import io
-import ripbcrypt
-from flask import send_file, redirect
-from supabase import create_client
-import re
-import uuid
+from db_pool import get_db_connection
+import attachment_zip
+import transaction_history
+import ticket_list
+import ticket_detail
+import conditional_get
+import ref_cache
+import work_queue
+import hash_pool
 
+# Load environment variables
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-MAX_INLINE_SIZE = 1 * 1024 * 1024  # 1 MB threshold for DB storage
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 staff_bp = Blueprint('staff', __name__, url_prefix='/staff')
 
-# Database connection function
-def get_db_connection():
-   return psycopg2.connect(os.getenv("DATABASE_URL"), sslmode="require")
 
 @staff_bp.route("/staff_main", methods=["GET"])
 def staff_main():
@@ -40,33 +31,37 @@ def staff_main():
 
    
     try:
-        # Fetch ALL tickets for this user
-        cursor.execute("""
-            SELECT 
-                t.ticket_id, t.title, t.description, t.status, 
-                t.created_date, t.last_update, 
-                t.type, t.urgency
-            FROM tickets t
-            WHERE t.assigner_id = %s and t.status NOT IN ('Closed')
-            ORDER BY t.created_date DESC
-        """, (user_id,))
-        tickets = cursor.fetchall()
-        bangkok = ZoneInfo("Asia/Bangkok")
-        for t in tickets:
-            if t["created_date"]:
-                t["created_date"] = t["created_date"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
-            if t["last_update"]:
-                t["last_update"] = t["last_update"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
+        # First page only; filters / further pages come from /staff/api/tickets
+        page = ticket_list.fetch_page(cursor, {}, "Staff", user_id)
 
         return render_template(
             "staff_main.html",
-            tickets=tickets,
+            tickets=page["tickets"],
+            next_cursor=page["next_cursor"],
             username=session.get('username')
         )
     finally:
         cursor.close()
         conn.close()
 
+@staff_bp.route('/api/tickets', methods=['GET'])
+def api_list_tickets():
+    if "user_id" not in session or session.get("role") != "Staff":
+        return jsonify({"message": "Unauthorized"}), 401
+
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        page = ticket_list.fetch_page(cursor, request.args, "Staff", session["user_id"])
+        return conditional_get.json_page(page)
+    except ticket_list.BadQuery as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"Error fetching tickets: {str(e)}"}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
 @staff_bp.route("/staff_ticket/<ticket_id>", methods=["GET"])
 def staff_view_ticket(ticket_id):
     if "user_id" not in session or session.get("role") != "Staff":
@@ -102,27 +97,11 @@ def api_get_transactions():
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     try:
-        # ✅ EXACT SAME QUERY as mod_main_core.py - fetches ALL transactions
-        cursor.execute("""
-            SELECT th.transaction_id,
-                   th.ticket_id,
-                   th.action_type,
-                   th.action_by      AS action_by_id,
-                   a.username        AS action_by_username,
-                   th.action_time,
-                   th.detail
-            FROM transaction_history th
-            LEFT JOIN "Accounts" a ON th.action_by = a.user_id
-            ORDER BY transaction_id DESC
-        """)
-        transactions = cursor.fetchall()
-
-        # ✅ EXACT SAME timezone conversion as mod
-        bangkok = ZoneInfo("Asia/Bangkok")
-        for t in transactions:
-            if t["action_time"]:
-                t["action_time"] = t["action_time"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
-        return jsonify(transactions), 200
+        # ✅ Same shared paginated query as mod_main_core.py
+        page = transaction_history.fetch_page(cursor, request.args)
+        return jsonify(page), 200
+    except transaction_history.BadQuery as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": f"Error fetching transactions: {str(e)}"}), 500
     finally:
@@ -139,65 +118,19 @@ def api_get_ticket(ticket_id):
     cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
     try:
-        # Fetch ticket information
-        cursor.execute("""
-            SELECT t.*, 
-                   ra.username AS reporter_username,
-                   aa.username AS assigner_username,
-                   aa.email AS user_email,
-                   aa.contact_number AS user_number
-            FROM tickets t
-            JOIN "Accounts" ra ON t.reporter_id = ra.user_id
-            LEFT JOIN "Accounts" aa ON t.reporter_id = aa.user_id
-            WHERE t.ticket_id = %s AND t.assigner_id = %s
-        """, (ticket_id, user_id))
-        ticket = cursor.fetchone()
+        # Cheap validator check first; unchanged tickets skip the full query
+        validators = ticket_detail.validators(conn, cursor, ticket_id, "Staff", user_id)
+        if not validators:
+            return jsonify({"message": "Ticket not found or access denied"}), 404
+        cached = conditional_get.not_modified(*validators)
+        if cached:
+            return cached
 
+        ticket = ticket_detail.fetch(conn, cursor, ticket_id, "Staff", user_id)
         if not ticket:
             return jsonify({"message": "Ticket not found or access denied"}), 404
 
-        # Fetch attachments for this ticket
-        cursor.execute("""
-            SELECT filename, mime_type, upload_date
-            FROM ticket_attachments
-            WHERE ticket_id = %s
-            ORDER BY upload_date DESC
-        """, (ticket_id,))
-        attachments = cursor.fetchall()
-
-        bangkok = ZoneInfo("Asia/Bangkok")
-        created_date = ticket["created_date"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M") if ticket["created_date"] else None
-        last_update = ticket["last_update"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M") if ticket["last_update"] else None
-
-        attachments_data = []
-        for att in attachments:
-            upload_date = att["upload_date"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M") if att["upload_date"] else None
-            attachments_data.append({
-                "filename": att["filename"],
-                "filetype": att["mime_type"],
-                "upload_date": upload_date
-            })
-
-        # Format the response
-        ticket_data = {
-            "id": ticket["ticket_id"],
-            "title": ticket["title"],
-            "description": ticket["description"],
-            "status": ticket["status"],
-            "type": ticket["type"],
-            "urgency": ticket["urgency"],
-            "created_date": created_date,
-            "last_update": last_update,
-            "reporter_username": ticket["reporter_username"],
-            "user_email": ticket["user_email"],
-            "user_number": ticket["user_number"],
-            "client_messages": ticket.get("client_message",""),
-            "dev_messages" : ticket.get("dev_message",""),
-            "attachments": attachments_data
-                
-        }
-
-        return jsonify(ticket_data)
+        return conditional_get.json_response(ticket_detail.to_response(ticket, "Staff"), *validators)
         
     finally:
         cursor.close()
@@ -238,10 +171,7 @@ def api_update_ticket(ticket_id):
         """, (client_message, dev_message, now, ticket_id, staff_id))
         
         # Log the transaction
-        cursor.execute("""
-            INSERT INTO transaction_history (ticket_id, action_type, action_by, action_time, detail)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (ticket_id, 'update', staff_id, now, 'Staff updated ticket messages'))
+        transaction_history.record(cursor, (ticket_id, 'update', staff_id, now, 'Staff updated ticket messages'))
 
         conn.commit()
         return jsonify({"message": "Updates saved successfully!"}), 200
@@ -253,6 +183,36 @@ def api_update_ticket(ticket_id):
         cursor.close()
         conn.close()
 
+@staff_bp.route('/api/queue/claim', methods=['POST'])
+def api_claim_next_ticket():
+    if "user_id" not in session or session.get("role") != "Staff":
+        return jsonify({"message": "Unauthorized"}), 401
+
+    staff_id = session.get("user_id")
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    try:
+        specialities = ref_cache.specialities_of(staff_id, cursor)
+        ticket = work_queue.claim_next(cursor, staff_id, session.get("username"), specialities)
+
+        if ticket is None:
+            conn.rollback()
+            return jsonify({"message": "No open tickets match your specialities"}), 404
+
+        conn.commit()
+        return jsonify({
+            "message": f"Ticket {ticket['ticket_id']} claimed successfully!",
+            "ticket": ticket
+        }), 200
+
+    except Exception as e:
+        conn.rollback()
+        return jsonify({"message": f"Claim failed: {str(e)}"}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
 @staff_bp.route('/api/tickets/<ticket_id>/status', methods=['POST'])
 def api_change_status(ticket_id):
     if "user_id" not in session or session.get("role") != "Staff":
@@ -302,10 +262,7 @@ def api_change_status(ticket_id):
             return jsonify({"message": "Ticket not found or status change not allowed"}), 400
 
         # Log the transaction
-        cursor.execute("""
-            INSERT INTO transaction_history (ticket_id, action_type, action_by, action_time, detail)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (ticket_id, 'status_change', staff_id, now, f'Status changed to {new_status} by Staff'))
+        transaction_history.record(cursor, (ticket_id, 'status_change', staff_id, now, f'Status changed to {new_status} by Staff'))
 
         conn.commit()
         
@@ -342,7 +299,7 @@ def api_get_attachments(ticket_id):
             return jsonify({"message": "Ticket not found or access denied"}), 404
 
         cursor.execute("""
-            SELECT id, filename, mime_type as file_type, upload_date
+            SELECT id, filename, mime_type as file_type, upload_date, storage_status
             FROM ticket_attachments
             WHERE ticket_id = %s
             ORDER BY upload_date DESC
@@ -385,7 +342,7 @@ def update_account():
             return redirect(url_for('user.user_dashboard'))
         
         # Verify current password with bcrypt
-        if not ripbcrypt.checkpw(current_password, user['password_hash']):
+        if not hash_pool.checkpw(current_password, user['password_hash']):
             flash("Current password is incorrect", "error")
             return redirect(url_for('user.user_dashboard'))
         
@@ -398,13 +355,16 @@ def update_account():
         
         # Update password if provided
         if new_password:
-            hashed_pw = ripbcrypt.hashpw(new_password, ripbcrypt.gensalt())
+            hashed_pw = hash_pool.hashpw(new_password)
             cursor.execute('UPDATE "Accounts" SET password_hash = %s WHERE user_id = %s', 
                           (hashed_pw, user_id))
             flash("Password updated successfully", "success")
         
         conn.commit()
         
+    except hash_pool.HashPoolFull:
+        conn.rollback()
+        return hash_pool.busy_response()
     except Exception as e:
         conn.rollback()
         flash(f"Error updating account: {str(e)}", "error")
@@ -414,107 +374,15 @@ def update_account():
     
     return redirect(url_for('staff.staff_main'))
 
-from flask import send_file
-import io
-
-import zipfile
-import io
-from flask import send_file, redirect
-
 @staff_bp.route('/api/tickets/<ticket_id>/attachments/download-all', methods=['GET'])
 def download_all_attachments(ticket_id):
     if "user_id" not in session:
         return jsonify({"message": "Unauthorized"}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
     try:
-        cursor.execute("""
-            SELECT id, filename, mime_type, filedata, file_url
-            FROM ticket_attachments
-            WHERE ticket_id = %s
-        """, (ticket_id,))
-        attachments = cursor.fetchall()
-
-        if not attachments:
-            return jsonify({"message": "No attachments found"}), 404
-
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for att in attachments:
-                if att["filedata"]:  # Inline in DB
-                    zipf.writestr(att["filename"], att["filedata"])
-                elif att["file_url"]:  # Stored in Supabase
-                      try:
-                           bucket_name, file_path = extract_bucket_and_path(att["file_url"])
-        
-                           # Download file from Supabase
-                           res = supabase.storage.from_(bucket_name).download(file_path)
-                           if res is not None:
-                               zipf.writestr(att["filename"], res)
-                           else:
-                                 zipf.writestr(att["filename"] + ".url.txt", 
-                                    f"File could not be retrieved. Original URL: {att['file_url']}")
-                      except Exception as e:
-                               zipf.writestr(att["filename"] + ".error.txt", 
-                                f"Error downloading file: {str(e)}")
-
-        zip_buffer.seek(0)
-
-        return send_file(
-            zip_buffer,
-            mimetype="application/zip",
-            as_attachment=True,
-            download_name=f"ticket_{ticket_id}_attachments.zip"
-        )
-
+        return attachment_zip.download_all_response(ticket_id)
     except Exception as e:
         return jsonify({"message": f"Download failed: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
-
-def extract_bucket_and_path(file_url):
-    """
-    Extract bucket name and file path from Supabase storage URL
-    Example URL: https://xyz.supabase.co/storage/v1/object/public/bucket-name/path/to/file
-    """
-    try:
-        # Remove the protocol and split by '/'
-        parts = file_url.replace("https://", "").replace("http://", "").split('/')
-        
-        # Find the index of 'object' which is part of the Supabase URL structure
-        try:
-            object_index = parts.index('object')
-        except ValueError:
-            # If 'object' is not found, try a different approach
-            # Look for 'storage' which is another common part
-            try:
-                storage_index = parts.index('storage')
-                # The bucket should be after 'public'
-                public_index = parts.index('public', storage_index)
-                if public_index + 1 < len(parts):
-                    bucket_name = parts[public_index + 1]
-                    file_path = '/'.join(parts[public_index + 2:])
-                    return bucket_name, file_path
-            except ValueError:
-                pass
-            
-            # If we can't parse the URL, return defaults
-            return "large_file_for_db", file_url.split('/public/')[-1] if '/public/' in file_url else ""
-        
-        # The bucket should be two parts after 'object'
-        if object_index + 3 < len(parts):
-            bucket_name = parts[object_index + 2]
-            file_path = '/'.join(parts[object_index + 3:])
-            return bucket_name, file_path
-        else:
-            return "large_file_for_db", file_url.split('/public/')[-1] if '/public/' in file_url else ""
-    except Exception as e:
-        print(f"Error parsing URL {file_url}: {str(e)}")
-        return "large_file_for_db", file_url.split('/public/')[-1] if '/public/' in file_url else ""
-
 @staff_bp.route('/api/account_info', methods=['GET'])
 def api_account_info():
     if 'user_id' not in session or session.get('role') != 'Staff':
@@ -536,4 +404,4 @@ def api_account_info():
         return jsonify(account)
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
@@ -0,0 +1,95 @@
+import sys
+import psycopg2.extras
+from db_pool import get_db_connection
+
+# -------------------------
+# Per-staff open-assignment counters (staff_workload, migrations/0005).
+# A trigger on tickets keeps open_count equal to the number of non-Closed
+# tickets assigned to each staff member, so matching sorts on a stored
+# number instead of aggregating the tickets table.
+# check() compares the counters with a fresh count; rebuild() repairs them.
+#
+#   python staff_workload.py           report drift
+#   python staff_workload.py rebuild   repair drift
+# -------------------------
+
+
+# params: (user_ids, user_ids); NULL means every staff account
+WORKLOADS_SQL = """
+    SELECT a.user_id,
+           a.username,
+           COALESCE(w.open_count, 0) AS current_assignment_count
+    FROM "Accounts" a
+    LEFT JOIN staff_workload w ON w.user_id = a.user_id::text
+    WHERE a.role = 'Staff'
+      AND (%s::text[] IS NULL OR a.user_id = ANY(%s::text[]))
+    ORDER BY current_assignment_count ASC, a.user_id
+"""
+
+
+def workloads(cursor, user_ids=None):
+    """
+    [{user_id, username, current_assignment_count}] for staff accounts,
+    least loaded first; limited to user_ids when given.
+    """
+    cursor.execute(WORKLOADS_SQL, (user_ids, user_ids))
+    return cursor.fetchall()
+
+
+def _drift(cursor):
+    cursor.execute("""
+        SELECT COALESCE(w.user_id, actual.user_id) AS user_id,
+               COALESCE(w.open_count, 0) AS stored,
+               COALESCE(actual.open_count, 0) AS actual
+        FROM staff_workload w
+        FULL JOIN (
+            SELECT assigner_id::text AS user_id, COUNT(*) AS open_count
+            FROM tickets
+            WHERE assigner_id IS NOT NULL AND status::text <> 'Closed'
+            GROUP BY 1
+        ) actual ON actual.user_id = w.user_id
+        WHERE COALESCE(w.open_count, 0) <> COALESCE(actual.open_count, 0)
+    """)
+    return {row["user_id"]: (row["stored"], row["actual"]) for row in cursor.fetchall()}
+
+
+def check(connect=get_db_connection, repair=False):
+    """
+    {user_id: (stored, actual)} for every counter that disagrees with the
+    tickets table; with repair=True the counters are corrected as well
+    (writers to tickets are held off meanwhile so the result is exact).
+    """
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        if repair:
+            cursor.execute("LOCK TABLE tickets IN SHARE MODE")
+        drift = _drift(cursor)
+        if repair and drift:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO staff_workload (user_id, open_count) VALUES %s
+                ON CONFLICT (user_id) DO UPDATE SET open_count = EXCLUDED.open_count
+            """, [(user_id, actual) for user_id, (_, actual) in drift.items()])
+        conn.commit()
+        return drift
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def rebuild(connect=get_db_connection):
+    return check(connect, repair=True)
+
+
+if __name__ == '__main__':
+    repair = len(sys.argv) > 1 and sys.argv[1] == "rebuild"
+    drift = check(repair=repair)
+    for user_id, (stored, actual) in sorted(drift.items()):
+        print(f"{user_id}: stored {stored}, actual {actual}{' (fixed)' if repair else ''}")
+    if not drift:
+        print("Staff workload counters are consistent")
+    elif not repair:
+        sys.exit(1)
@@ -0,0 +1,465 @@
+import io
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeout, wait
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -------------------------
+# Process-wide gateway to Supabase storage.
+# One client is created on first use and shared by every blueprint, so its
+# HTTP connection pool (keep-alive TCP/TLS sessions) is reused across requests.
+# Calls run on one executor of STORAGE_WORKERS threads, which is also the
+# HTTP pool size; callers that fan out (uploads, ZIP downloads) submit to it
+# directly with upload_async() / download_async() instead of keeping pools of
+# their own. A call's timeout starts when a worker picks it up: time queued
+# behind other calls is not a storage failure (a call that never gets a worker
+# within STORAGE_QUEUE_TIMEOUT fails with StorageBusy and leaves the breaker
+# alone). The HTTP client's own timeouts bound how long a call that timed out
+# keeps its worker.
+# A circuit breaker trips after BREAKER_THRESHOLD consecutive failures; while
+# open, calls fail immediately with StorageUnavailable, and after
+# BREAKER_COOLDOWN one trial call is let through to probe for recovery.
+# -------------------------
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+DEFAULT_BUCKET = os.getenv("STORAGE_BUCKET", "large_file_for_db")
+
+# Per-call timeouts in seconds; the client-level HTTP timeout is the largest of them
+UPLOAD_TIMEOUT = float(os.getenv("STORAGE_UPLOAD_TIMEOUT", "60"))
+DOWNLOAD_TIMEOUT = float(os.getenv("STORAGE_DOWNLOAD_TIMEOUT", "30"))
+DELETE_TIMEOUT = float(os.getenv("STORAGE_DELETE_TIMEOUT", "10"))
+SIGN_TIMEOUT = float(os.getenv("STORAGE_SIGN_TIMEOUT", "10"))
+SIGNED_URL_EXPIRES = int(os.getenv("STORAGE_SIGNED_URL_EXPIRES", "3600"))
+CONNECT_TIMEOUT = float(os.getenv("STORAGE_CONNECT_TIMEOUT", "10"))
+QUEUE_TIMEOUT = float(os.getenv("STORAGE_QUEUE_TIMEOUT", "30"))      # max wait for a free worker
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "16"))
+BREAKER_THRESHOLD = int(os.getenv("STORAGE_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("STORAGE_BREAKER_COOLDOWN", "30"))
+
+OPERATIONS = ("upload", "download", "delete", "signed_url")
+# What storage3 uploads as-is; any other object is passed to open() and fails
+UPLOAD_TYPES = (bytes, io.BufferedReader, io.FileIO)
+
+
+class StorageError(Exception):
+    """A storage call failed."""
+
+
+class StorageTimeout(StorageError):
+    """A storage call did not finish within its timeout."""
+
+
+class StorageUnavailable(StorageError):
+    """The circuit breaker is open; the call was not attempted."""
+
+
+class StorageBusy(StorageError):
+    """No storage worker became free in time; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """closed -> (threshold failures) -> open -> (cooldown) -> half_open -> closed/open"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._counters = {"opened": 0, "rejected": 0}
+
+    def allow(self):
+        """Reserve the right to make one call; raises StorageUnavailable while open."""
+        with self._lock:
+            if self._state == "open" and self.clock() - self._opened_at >= self.cooldown:
+                self._state = "half_open"
+                self._probing = False
+            if self._state == "closed":
+                return
+            if self._state == "half_open" and not self._probing:
+                self._probing = True  # This caller is the recovery probe
+                return
+            self._counters["rejected"] += 1
+            retry_in = max(self.cooldown - (self.clock() - self._opened_at), 0.0)
+        raise StorageUnavailable(f"storage unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def release(self):
+        """Give back an allow() whose call was never made."""
+        with self._lock:
+            if self._state == "half_open":
+                self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.threshold:
+                if self._state != "open":
+                    self._counters["opened"] += 1
+                self._state = "open"
+                self._opened_at = self.clock()
+                self._probing = False
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        with self._lock:
+            if self._state != "open":
+                return 0.0
+            return max(self.cooldown - (self.clock() - self._opened_at), 0.0)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data.update(state=self._state, consecutive_failures=self._failures)
+        return data
+
+
+_client = None
+_client_lock = threading.Lock()
+breaker = CircuitBreaker()
+_executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+_metrics_lock = threading.Lock()
+_metrics = {
+    op: {"calls": 0, "errors": 0, "timeouts": 0, "busy": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+    for op in OPERATIONS
+}
+
+
+def _create_client():
+    # supabase.ClientOptions is the sync variant; the base class in
+    # supabase.lib.client_options lacks the storage settings create_client reads
+    from supabase import ClientOptions, create_client
+    import httpx
+
+    # Per-phase limits: a stalled connect / read / write gives its worker back
+    # even after the caller has stopped waiting for the call
+    timeout = httpx.Timeout(max(UPLOAD_TIMEOUT, DOWNLOAD_TIMEOUT, DELETE_TIMEOUT, SIGN_TIMEOUT),
+                            connect=CONNECT_TIMEOUT)
+    http_client = httpx.Client(timeout=timeout, follow_redirects=True, http2=True,
+                               limits=httpx.Limits(max_connections=STORAGE_WORKERS,
+                                                   max_keepalive_connections=STORAGE_WORKERS))
+    return create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=http_client))
+
+
+def get_client():
+    """The shared Supabase client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+
+def _bucket(bucket):
+    return get_client().storage.from_(bucket or DEFAULT_BUCKET)
+
+
+def _record(op, elapsed, error=None):
+    with _metrics_lock:
+        m = _metrics[op]
+        m["calls"] += 1
+        m["total_seconds"] += elapsed
+        m["max_seconds"] = max(m["max_seconds"], elapsed)
+        if error is not None:
+            m["errors"] += 1
+            if isinstance(error, StorageTimeout):
+                m["timeouts"] += 1
+
+
+def _is_client_error(error):
+    """4xx answers (missing object, bad path...) say nothing about storage health."""
+    for arg in getattr(error, "args", ()):
+        if isinstance(arg, dict):
+            try:
+                return 400 <= int(arg.get("statusCode") or arg.get("status") or 0) < 500
+            except (TypeError, ValueError):
+                return False
+    return False
+
+
+class StorageCall:
+    """
+    One storage call queued on the executor. result() waits for it; the
+    timeout counts from when a worker starts the call. The outcome is fed to
+    the breaker exactly once, by whichever of the worker and the waiting
+    caller settles it first.
+    """
+
+    def __init__(self, op, timeout, fn, *args):
+        breaker.allow()
+        self.op = op
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._settled = False
+        self._started_at = None
+        self._started = threading.Event()
+        self._submitted_at = time.monotonic()
+        self._future = _executor.submit(self._run, fn, args)
+
+    def _run(self, fn, args):
+        self._started_at = time.monotonic()
+        self._started.set()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._settle(e, failed=not _is_client_error(e))
+            raise
+        self._settle()
+        return result
+
+    def _settle(self, error=None, failed=None):
+        """Record the outcome; False if it had already been recorded."""
+        with self._lock:
+            if self._settled:
+                return False
+            self._settled = True
+        if failed is None:
+            failed = error is not None
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        _record(self.op, time.monotonic() - self._started_at, error)
+        return True
+
+    def cancel(self):
+        """Drop the call if no worker has started it; True if it will never run."""
+        if self._future.cancel():
+            breaker.release()
+            return True
+        return False
+
+    def _time_left(self):
+        """Seconds until result() stops waiting: the run timeout once started, else the queue timeout."""
+        if self._started.is_set():
+            return self._started_at + self.timeout - time.monotonic()
+        return self._submitted_at + QUEUE_TIMEOUT - time.monotonic()
+
+    def ready(self):
+        """True once result() returns or raises without blocking."""
+        return self._future.done() or self._time_left() <= 0
+
+    def result(self):
+        queue_left = self._submitted_at + QUEUE_TIMEOUT - time.monotonic()
+        if not self._started.wait(max(queue_left, 0)) and self.cancel():
+            with _metrics_lock:
+                _metrics[self.op]["busy"] += 1
+            raise StorageBusy(f"storage {self.op} not started: all {STORAGE_WORKERS} workers "
+                              f"busy for {QUEUE_TIMEOUT}s")
+        self._started.wait()
+        remaining = self.timeout - (time.monotonic() - self._started_at)
+        try:
+            try:
+                return self._future.result(timeout=max(remaining, 0))
+            except FuturesTimeout:
+                error = StorageTimeout(f"storage {self.op} timed out after {self.timeout}s")
+                if self._settle(error):
+                    raise error
+                # Finished just as the wait ran out: take its real outcome
+                return self._future.result()
+        except StorageError:
+            raise
+        except Exception as e:
+            raise StorageError(f"storage {self.op} failed: {e}") from e
+
+
+def wait_any(calls):
+    """Block until at least one of calls is ready(); returns the ready ones."""
+    while True:
+        ready = [call for call in calls if call.ready()]
+        if ready:
+            return ready
+        wait([call._future for call in calls], timeout=min(call._time_left() for call in calls),
+             return_when=FIRST_COMPLETED)
+
+
+def _call(op, timeout, fn, *args):
+    """Run fn(*args) on the storage executor and wait for it."""
+    return StorageCall(op, timeout, fn, *args).result()
+
+
+def upload_async(path, file, bucket=None, content_type=None, timeout=None):
+    """
+    Start uploading bytes or a file opened with open(path, "rb") to
+    bucket/path (keep the file open until the call is done).
+    Returns a StorageCall whose result() is the public URL of the object.
+    """
+    if not isinstance(file, UPLOAD_TYPES):
+        raise TypeError(f"upload() takes bytes or a file from open(path, 'rb'), not {type(file).__name__}")
+
+    def run():
+        file_options = {"content-type": content_type} if content_type else None
+        if file_options:
+            _bucket(bucket).upload(path, file, file_options)
+        else:
+            _bucket(bucket).upload(path, file)
+        return public_url(path, bucket)
+
+    return StorageCall("upload", timeout or UPLOAD_TIMEOUT, run)
+
+
+def upload(path, file, bucket=None, content_type=None, timeout=None):
+    """Upload to bucket/path and return the public URL (see upload_async)."""
+    return upload_async(path, file, bucket, content_type, timeout).result()
+
+
+def download_async(path, bucket=None, timeout=None):
+    """Start fetching bucket/path; the StorageCall's result() is the bytes."""
+    return StorageCall("download", timeout or DOWNLOAD_TIMEOUT, lambda: _bucket(bucket).download(path))
+
+
+def download(path, bucket=None, timeout=None):
+    """Bytes of bucket/path."""
+    return download_async(path, bucket, timeout).result()
+
+
+def delete(paths, bucket=None, timeout=None):
+    """Remove one path or a list of paths from bucket."""
+    if isinstance(paths, str):
+        paths = [paths]
+    return _call("delete", timeout or DELETE_TIMEOUT, lambda: _bucket(bucket).remove(list(paths)))
+
+
+def signed_url(path, bucket=None, expires_in=SIGNED_URL_EXPIRES, timeout=None):
+    """Time-limited URL for bucket/path."""
+    def run():
+        res = _bucket(bucket).create_signed_url(path, expires_in)
+        url = res.get("signedURL") or res.get("signedUrl")
+        if not url:
+            raise StorageError(f"no signed URL returned for {path}")
+        return url
+
+    return _call("signed_url", timeout or SIGN_TIMEOUT, run)
+
+
+def storage_path_for(ticket_id, filename):
+    """Object path for a ticket attachment: <ticket_id>/<unique>_<sanitised filename>."""
+    # Sanitize filename to remove invalid characters
+    safe_filename = re.sub(r'[^a-zA-Z0-9\.\_\-]', '_', filename)
+    # Add a unique identifier to prevent filename collisions
+    unique_id = uuid.uuid4().hex[:8]
+    return f"{ticket_id}/{unique_id}_{safe_filename}"
+
+
+def public_url(path, bucket=None):
+    return f"{SUPABASE_URL}/storage/v1/object/public/{bucket or DEFAULT_BUCKET}/{path}"
+
+
+def stats():
+    with _metrics_lock:
+        data = {op: dict(m) for op, m in _metrics.items()}
+    for m in data.values():
+        m["avg_seconds"] = m["total_seconds"] / m["calls"] if m["calls"] else 0.0
+    data["client_created"] = _client is not None
+    data["breaker"] = breaker.stats()
+    return data
+
+
+class LocalStorage:
+    """
+    Directory-backed stand-in with the same upload/download/delete/signed_url
+    calls as this module, for development and tests without Supabase.
+    """
+
+    def __init__(self, root, base_url="http://localhost/storage/v1/object/public"):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def _file(self, path, bucket):
+        full = os.path.realpath(os.path.join(self.root, bucket or DEFAULT_BUCKET, path))
+        if not full.startswith(os.path.realpath(self.root) + os.sep):
+            raise StorageError(f"invalid storage path {path!r}")
+        return full
+
+    def upload(self, path, file, bucket=None, content_type=None, timeout=None):
+        # Same inputs as the Supabase client: it only sends bytes or a file from open(path, "rb")
+        if not isinstance(file, UPLOAD_TYPES):
+            raise TypeError(f"upload() takes bytes or a file from open(path, 'rb'), not {type(file).__name__}")
+        full = self._file(path, bucket)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "wb") as out:
+            if isinstance(file, bytes):
+                out.write(file)
+            else:
+                shutil.copyfileobj(file, out)
+        return self.public_url(path, bucket)
+
+    def download(self, path, bucket=None, timeout=None):
+        try:
+            with open(self._file(path, bucket), "rb") as f:
+                return f.read()
+        except OSError as e:
+            raise StorageError(f"storage download failed: {e}") from e
+
+    def delete(self, paths, bucket=None, timeout=None):
+        if isinstance(paths, str):
+            paths = [paths]
+        for path in paths:
+            try:
+                os.remove(self._file(path, bucket))
+            except FileNotFoundError:
+                pass
+        return list(paths)
+
+    def signed_url(self, path, bucket=None, expires_in=SIGNED_URL_EXPIRES, timeout=None):
+        return f"{self.public_url(path, bucket)}?expires_in={expires_in}"
+
+    def public_url(self, path, bucket=None):
+        return f"{self.base_url}/{bucket or DEFAULT_BUCKET}/{path}"
+
+
+def extract_bucket_and_path(file_url):
+    """
+    Extract bucket name and file path from Supabase storage URL
+    Example URL: https://xyz.supabase.co/storage/v1/object/public/bucket-name/path/to/file
+    """
+    try:
+        # Remove the protocol and split by '/'
+        parts = file_url.replace("https://", "").replace("http://", "").split('/')
+
+        # Find the index of 'object' which is part of the Supabase URL structure
+        try:
+            object_index = parts.index('object')
+        except ValueError:
+            # If 'object' is not found, try a different approach
+            # Look for 'storage' which is another common part
+            try:
+                storage_index = parts.index('storage')
+                # The bucket should be after 'public'
+                public_index = parts.index('public', storage_index)
+                if public_index + 1 < len(parts):
+                    bucket_name = parts[public_index + 1]
+                    file_path = '/'.join(parts[public_index + 2:])
+                    return bucket_name, file_path
+            except ValueError:
+                pass
+
+            # If we can't parse the URL, return defaults
+            return DEFAULT_BUCKET, file_url.split('/public/')[-1] if '/public/' in file_url else ""
+
+        # The bucket should be two parts after 'object'
+        if object_index + 3 < len(parts):
+            bucket_name = parts[object_index + 2]
+            file_path = '/'.join(parts[object_index + 3:])
+            return bucket_name, file_path
+        else:
+            return DEFAULT_BUCKET, file_url.split('/public/')[-1] if '/public/' in file_url else ""
+    except Exception as e:
+        print(f"Error parsing URL {file_url}: {str(e)}")
+        return DEFAULT_BUCKET, file_url.split('/public/')[-1] if '/public/' in file_url else ""
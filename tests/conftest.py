@@ -0,0 +1,36 @@
+import pytest
+from testdb import TEST_DSN, connect
+
+# -------------------------
+# Database tests run against a disposable PostgreSQL database that already
+# holds the app's base schema (tickets, "Accounts", ticket_attachments, ...),
+# e.g. a local copy of the Supabase schema:
+#
+#   TEST_DATABASE_URL=postgresql://localhost/sa_test python -m pytest
+#
+# Without TEST_DATABASE_URL (or without the app's dependencies installed)
+# they are skipped. Pending migrations are applied once per session; each
+# test seeds its own rows and rolls them back or deletes them afterwards.
+# -------------------------
+
+
+@pytest.fixture(scope="session")
+def dsn():
+    if not TEST_DSN:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    pytest.importorskip("psycopg2")
+    pytest.importorskip("dotenv")
+    import migrate
+    migrate.apply(connect=connect, verbose=False)
+    return TEST_DSN
+
+
+@pytest.fixture
+def pg(dsn):
+    """A connection whose work is rolled back after the test."""
+    conn = connect()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,53 @@
+import time
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("flask")
+import attachment_upload  # noqa: E402
+import storage_gateway  # noqa: E402
+
+SLOW = 0.6
+FAST = 0.1
+
+
+class FakeUpload:
+    mimetype = "application/octet-stream"
+
+    def __init__(self, path):
+        self.path = path
+        self.filename = path.name
+
+    def open(self):
+        return open(self.path, "rb")
+
+
+class FakeBucket:
+    def upload(self, path, file, file_options=None):
+        assert file.read() == b"payload"
+        time.sleep(SLOW if "slow" in path else FAST)
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_gateway, "_bucket", lambda bucket: FakeBucket())
+    monkeypatch.setattr(storage_gateway, "breaker", storage_gateway.CircuitBreaker())
+    monkeypatch.setattr(attachment_upload, "UPLOAD_PARALLELISM", 2)
+    files = []
+    for name in ["slow.bin"] + [f"fast{i}.bin" for i in range(5)]:
+        path = tmp_path / name
+        path.write_bytes(b"payload")
+        files.append(FakeUpload(path))
+    return files
+
+
+def test_slow_upload_does_not_hold_back_the_others(uploads):
+    began = time.monotonic()
+    outcomes = attachment_upload._upload_all(1, uploads)
+    elapsed = time.monotonic() - began
+
+    assert [error for _, error in outcomes] == [None] * len(uploads)
+    assert all(url.endswith(upload.filename) for (url, _), upload in zip(outcomes, uploads))
+    # The fast files share the second slot while the slow one runs: ~SLOW in
+    # total, where refilling in submission order would take SLOW + 4 * FAST
+    assert elapsed < SLOW + 2 * FAST
@@ -0,0 +1,30 @@
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+import bulk_write  # noqa: E402
+
+BLOBS = [b"", b"\x00\x01\\x\t\n\r\xff", bytes(range(256)) * 4]
+
+
+@pytest.fixture
+def blobs(pg):
+    cursor = pg.cursor()
+    cursor.execute("CREATE TEMP TABLE bulk_blobs (id integer PRIMARY KEY, data bytea)")
+    yield cursor
+    cursor.close()
+
+
+@pytest.mark.parametrize("threshold", [1, 10_000], ids=["copy", "values"])
+def test_bytea_round_trips_on_both_paths(blobs, monkeypatch, threshold):
+    monkeypatch.setattr(bulk_write, "COPY_THRESHOLD", threshold)
+    rows = [(i, psycopg2.Binary(blob)) for i, blob in enumerate(BLOBS)]
+    rows.append((len(BLOBS), None))
+    bulk_write.insert_many(blobs, "bulk_blobs", ("id", "data"), rows)
+    blobs.execute("SELECT data FROM bulk_blobs ORDER BY id")
+    stored = [row[0] if row[0] is None else bytes(row[0]) for row in blobs.fetchall()]
+    assert stored == BLOBS + [None]
+
+
+def test_copy_rejects_sql_literal_adapters():
+    with pytest.raises(TypeError):
+        bulk_write._copy_value(psycopg2.extensions.AsIs("now()"))
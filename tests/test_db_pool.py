@@ -0,0 +1,76 @@
+import threading
+import time
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("flask")
+import psycopg2.extensions  # noqa: E402
+import db_pool  # noqa: E402
+
+
+class FakeRaw:
+    closed = False
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(db_pool.ConnectionPool):
+    def _connect(self):
+        return db_pool.PooledConnection(self, FakeRaw())
+
+
+def test_stale_lease_does_not_release_the_next_checkout():
+    pool = FakePool(min_size=0, max_size=1, timeout=1)
+    conn = pool.getconn()
+    first_lease = conn._lease
+    conn.close()
+
+    again = pool.getconn()  # same connection, new request
+    assert again is conn
+    pool.release(conn, first_lease)  # the first request's teardown, arriving late
+    assert pool.stats()["in_use"] == 1
+    pool.timeout = 0.05
+    with pytest.raises(db_pool.PoolTimeout):
+        pool.getconn()
+
+    pool.release(again, again._lease)
+    assert pool.stats()["in_use"] == 0
+
+
+def test_racing_teardowns_never_share_a_connection():
+    pool = FakePool(min_size=0, max_size=2, timeout=5)
+    owners = {}
+    errors = []
+    lock = threading.Lock()
+
+    def request(n):
+        for _ in range(500):
+            conn = pool.getconn()
+            lease = conn._lease
+            with lock:
+                if id(conn) in owners:
+                    errors.append(f"connection shared by requests {owners[id(conn)]} and {n}")
+                owners[id(conn)] = n
+            time.sleep(0)
+            with lock:
+                if conn._released or owners.get(id(conn)) != n:
+                    errors.append(f"connection of request {n} was released under it")
+                owners.pop(id(conn), None)
+            conn.close()
+            pool.release(conn, lease)  # teardown after the handler already closed it
+
+    threads = [threading.Thread(target=request, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert pool.stats()["in_use"] == 0
@@ -0,0 +1,84 @@
+import socket
+import threading
+import time
+import pytest
+
+pytest.importorskip("dns")
+import dns_patch  # noqa: E402
+
+TTL = 0.05
+
+
+class FakeResolver:
+    def __init__(self, answer=("10.0.0.1", 0), error=None, gate=None):
+        self.answer = answer
+        self.error = error
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self, hostname):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+
+def _cache(resolve):
+    # hot_hits out of reach: no background refreshes in these tests
+    return dns_patch.DnsCache(resolve=resolve, min_ttl=TTL, negative_ttl=TTL, hot_hits=10 ** 6)
+
+
+def test_answer_is_cached_until_its_ttl_expires():
+    resolve = FakeResolver()
+    cache = _cache(resolve)
+
+    assert cache.get("storage.example") == "10.0.0.1"
+    assert cache.get("storage.example") == "10.0.0.1"
+    assert resolve.calls == 1
+
+    time.sleep(TTL * 2)
+    resolve.answer = ("10.0.0.2", 0)
+    assert cache.get("storage.example") == "10.0.0.2"
+    assert resolve.calls == 2
+
+
+def test_failure_is_cached_and_raised_as_a_fresh_exception():
+    resolve = FakeResolver(error=socket.gaierror(-2, "Name or service not known"))
+    cache = _cache(resolve)
+
+    with pytest.raises(socket.gaierror) as first:
+        cache.get("missing.example")
+    with pytest.raises(socket.gaierror) as second:
+        cache.get("missing.example")
+    assert resolve.calls == 1
+    assert first.value is not second.value
+    assert second.value.args == (-2, "Name or service not known")
+    assert cache.stats()["negative_hits"] == 1
+
+    time.sleep(TTL * 2)
+    resolve.error = None
+    assert cache.get("missing.example") == "10.0.0.1"
+    assert resolve.calls == 2
+
+
+def test_concurrent_misses_share_one_lookup():
+    gate = threading.Event()
+    resolve = FakeResolver(gate=gate)
+    cache = _cache(resolve)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("storage.example")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["misses"] < len(threads) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["10.0.0.1"] * len(threads)
+    assert resolve.calls == 1
+    assert cache.stats()["coalesced"] == len(threads) - 1
@@ -0,0 +1,71 @@
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("flask")
+import psycopg2.extras  # noqa: E402
+import query_plans  # noqa: E402
+
+SEED_ACCOUNTS = 2000
+SEED_TICKETS = 20000
+
+
+def _seed(cursor):
+    """Enough rows that the planner's choices are realistic; rolled back by the pg fixture."""
+    cursor.execute("""
+        INSERT INTO "Accounts" (user_id, username, password_hash, role, account_status, email, contact_number)
+        SELECT 'plan' || lpad(g::text, 6, '0'), 'plan_user_' || g, 'x',
+               CASE WHEN g %% 10 = 0 THEN 'Staff' ELSE 'User' END, 1,
+               'plan' || g || '@example.com', '0000000000'
+        FROM generate_series(1, %s) g
+    """, (SEED_ACCOUNTS,))
+    cursor.execute("""
+        INSERT INTO tickets (ticket_id, title, description, type, urgency, reporter_id, assigner_id,
+                             status, created_date, last_update)
+        SELECT 9900000000 + g, 'plan ticket ' || g, 'seeded', 'Software',
+               (ARRAY['Low', 'Medium', 'High', 'Critical'])[1 + g %% 4],
+               'plan' || lpad((1 + g %% %s)::text, 6, '0'),
+               CASE WHEN g %% 3 = 0 THEN NULL ELSE 'plan' || lpad((10 * (1 + g %% 200))::text, 6, '0') END,
+               CASE WHEN g %% 3 = 0 THEN 'Open' WHEN g %% 3 = 1 THEN 'Assigned-in_queue' ELSE 'Closed' END,
+               now() - make_interval(mins => g), now() - make_interval(mins => g)
+        FROM generate_series(1, %s) g
+    """, (SEED_ACCOUNTS, SEED_TICKETS))
+    cursor.execute("""
+        INSERT INTO ticket_attachments (ticket_id, filename, mime_type, filedata, file_url, upload_date, storage_status)
+        SELECT 9900000000 + g, 'file' || g || '.txt', 'text/plain', NULL, 'https://example.com/' || g,
+               now(), CASE WHEN g %% 50 = 0 THEN 'fallback' ELSE 'stored' END
+        FROM generate_series(1, %s) g
+    """, (SEED_TICKETS,))
+    cursor.execute("""
+        INSERT INTO transaction_history (ticket_id, action_type, action_by, action_time, detail)
+        SELECT 9900000000 + g, 'assign', 'plan' || lpad((1 + g %% %s)::text, 6, '0'), now(), 'seeded'
+        FROM generate_series(1, %s) g
+    """, (SEED_ACCOUNTS, SEED_TICKETS))
+    cursor.execute("""
+        INSERT INTO attachment_upload_queue (attachment_id, spool_host, spool_path, storage_path)
+        SELECT 9900000000 + g, 'host' || g %% 4, '/tmp/' || g, 'path/' || g
+        FROM generate_series(1, %s) g
+    """, (SEED_TICKETS // 10,))
+    for table in ('"Accounts"', "tickets", "ticket_attachments", "transaction_history",
+                  "staff_workload", "attachment_upload_queue"):
+        cursor.execute(f"ANALYZE {table}")
+
+
+@pytest.fixture
+def seeded(pg):
+    cursor = pg.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    _seed(cursor)
+    yield cursor
+    cursor.close()
+
+
+@pytest.mark.parametrize("name", list(query_plans.HOT_QUERIES))
+def test_hot_query_uses_an_index(seeded, name):
+    sql, params = query_plans.HOT_QUERIES[name]
+    assert query_plans.seq_scans(seeded, sql, params) == []
+
+
+@pytest.mark.parametrize("name", query_plans.INDEX_ORDERED)
+def test_queue_query_reads_in_index_order(seeded, name):
+    sql, params = query_plans.HOT_QUERIES[name]
+    assert not query_plans.sorts(seeded, sql, params)
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("dns")
+flask = pytest.importorskip("flask")
+import admin_main_core  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(admin_main_core.admin_bp, url_prefix='/admin')
+    return app.test_client()
+
+
+def _login(client, role):
+    with client.session_transaction() as session:
+        session["user_id"] = "stats00001"
+        session["role"] = role
+
+
+def test_runtime_stats_requires_admin(client):
+    assert client.get("/admin/api/runtime_stats").status_code == 401
+    _login(client, "Staff")
+    assert client.get("/admin/api/runtime_stats").status_code == 401
+
+
+def test_runtime_stats_reports_every_component(client):
+    _login(client, "Admin")
+    response = client.get("/admin/api/runtime_stats")
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert set(data) == {"db_pool", "hash_pool", "dns_cache", "ref_cache", "storage", "upload_queue"}
+    assert {"size", "idle", "in_use", "max_size"} <= set(data["db_pool"])
+    assert {"in_flight", "max_workers"} <= set(data["hash_pool"])
+    assert {"entries", "hit_rate"} <= set(data["dns_cache"])
+    assert "skill_index" in data["ref_cache"]
+    assert data["storage"]["breaker"]["state"] == "closed"
+    assert "workers" in data["upload_queue"]
@@ -0,0 +1,82 @@
+import threading
+import time
+import pytest
+import storage_gateway
+
+
+def test_client_builds_with_storage_timeouts(monkeypatch):
+    pytest.importorskip("supabase")
+    monkeypatch.setattr(storage_gateway, "SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setattr(storage_gateway, "SUPABASE_KEY", "sb_secret_test")
+    client = storage_gateway._create_client()
+    timeout = client.storage.session.timeout
+    assert timeout.read == max(storage_gateway.UPLOAD_TIMEOUT, storage_gateway.DOWNLOAD_TIMEOUT,
+                               storage_gateway.DELETE_TIMEOUT, storage_gateway.SIGN_TIMEOUT)
+    assert timeout.connect == storage_gateway.CONNECT_TIMEOUT
+
+
+def test_local_storage_takes_what_the_client_takes(tmp_path):
+    storage = storage_gateway.LocalStorage(str(tmp_path))
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"payload")
+    with open(source, "rb") as f:
+        storage.upload("a/1.bin", f)
+    storage.upload("a/2.bin", b"payload")
+    assert storage.download("a/1.bin") == storage.download("a/2.bin") == b"payload"
+
+    # storage3 hands anything else to open(), which fails; the stand-in must too
+    with open(source, "r+b") as f, pytest.raises(TypeError):
+        storage.upload("a/3.bin", f)
+
+
+@pytest.fixture
+def one_worker(monkeypatch):
+    """A single storage worker and a fresh breaker, so queueing is easy to provoke."""
+    executor = storage_gateway.ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(storage_gateway, "_executor", executor)
+    monkeypatch.setattr(storage_gateway, "breaker", storage_gateway.CircuitBreaker(threshold=1))
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_timeout_starts_when_a_worker_picks_the_call_up(one_worker):
+    busy = storage_gateway.StorageCall("download", 5, time.sleep, 0.4)
+    # Queued for ~0.4s behind `busy`, then runs well within its own 0.3s
+    queued = storage_gateway.StorageCall("download", 0.3, lambda: b"data")
+    assert queued.result() == b"data"
+    busy.result()
+    assert storage_gateway.breaker.stats()["state"] == "closed"
+
+
+def test_slow_call_times_out_and_counts_once(one_worker):
+    call = storage_gateway.StorageCall("download", 0.1, time.sleep, 0.3)
+    with pytest.raises(storage_gateway.StorageTimeout):
+        call.result()
+    one_worker.shutdown(wait=True)  # let the call finish late
+    stats = storage_gateway.breaker.stats()
+    assert stats["state"] == "open" and stats["consecutive_failures"] == 1
+
+
+def test_saturated_executor_is_busy_not_a_storage_failure(one_worker, monkeypatch):
+    monkeypatch.setattr(storage_gateway, "QUEUE_TIMEOUT", 0.1)
+    release = threading.Event()
+    ran = []
+    blocker = storage_gateway.StorageCall("upload", 5, release.wait)
+    waiting = storage_gateway.StorageCall("upload", 5, ran.append, "ran")
+    with pytest.raises(storage_gateway.StorageBusy):
+        waiting.result()
+    release.set()
+    blocker.result()
+    one_worker.shutdown(wait=True)
+    assert ran == []
+    assert storage_gateway.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_dropped_probe_lets_the_next_call_probe():
+    clock = [0.0]
+    breaker = storage_gateway.CircuitBreaker(threshold=1, cooldown=10, clock=lambda: clock[0])
+    breaker.record_failure()
+    clock[0] = 10
+    breaker.allow()    # the probe...
+    breaker.release()  # ...was never sent
+    breaker.allow()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("flask")
+import storage_gateway  # noqa: E402
+import testdb  # noqa: E402
+import upload_queue  # noqa: E402
+
+# Fallback rows live in a private copy of ticket_attachments, so
+# migrate_fallbacks() sees only what the test seeded
+SCHEMA = "upload_queue_test"
+
+
+def connect():
+    return testdb.connect(options=f"-c search_path={SCHEMA},public")
+
+
+@pytest.fixture
+def attachments(dsn):
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.ticket_attachments (LIKE public.ticket_attachments INCLUDING ALL)")
+        conn.commit()
+        yield cursor
+    finally:
+        conn.rollback()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+def test_migrate_fallbacks_moves_blobs_to_storage(attachments, tmp_path):
+    # Spans several INLINE_CHUNK_SIZE slices, the last one partial
+    data = os.urandom(2 * upload_queue.INLINE_CHUNK_SIZE + 12345)
+    attachments.execute("""
+        INSERT INTO ticket_attachments (ticket_id, filename, mime_type, filedata, upload_date, storage_status)
+        VALUES (1, 'big report.bin', 'application/octet-stream', %s, now(), 'fallback')
+        RETURNING id
+    """, (psycopg2.Binary(data),))
+    attachment_id = attachments.fetchone()[0]
+    attachments.connection.commit()
+
+    storage = storage_gateway.LocalStorage(str(tmp_path))
+    assert upload_queue.migrate_fallbacks(storage=storage, connect=connect) == 1
+
+    attachments.execute("SELECT file_url, filedata, storage_status FROM ticket_attachments WHERE id = %s",
+                        (attachment_id,))
+    file_url, filedata, status = attachments.fetchone()
+    attachments.connection.commit()
+    assert status == "stored" and filedata is None
+    bucket, path = storage_gateway.extract_bucket_and_path(file_url)
+    assert storage.download(path, bucket) == data
+    assert not [name for name in os.listdir(tempfile.gettempdir()) if name.startswith("fallback_")]
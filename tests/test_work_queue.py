@@ -0,0 +1,168 @@
+import threading
+import time
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+pytest.importorskip("flask")
+import psycopg2.extras  # noqa: E402
+import work_queue  # noqa: E402
+import testdb  # noqa: E402
+
+STAFF = 8
+TICKETS = 60
+TICKET_BASE = 9800000000
+SPECIALITY = "QueueTest"
+URGENCIES = ("Low", "Medium", "High", "Critical")
+URGENCY_RANK = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3}
+# claim_next also takes NULL / "Other" tickets, which any other open ticket in
+# the database could be. The claimers therefore run against a private copy of
+# tickets (same columns and indexes) that holds only the seeded rows;
+# "Accounts" and transaction_history still resolve to the real tables.
+SCHEMA = "work_queue_test"
+
+
+def connect():
+    return testdb.connect(options=f"-c search_path={SCHEMA},public")
+
+
+def _staff_id(n):
+    return "queue" + str(n).zfill(5)
+
+
+def _cleanup(cursor):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute("DELETE FROM public.transaction_history WHERE ticket_id BETWEEN %s AND %s",
+                   (TICKET_BASE, TICKET_BASE + TICKETS))
+    cursor.execute('DELETE FROM public."Accounts" WHERE user_id = ANY(%s)',
+                   ([_staff_id(n) for n in range(1, STAFF + 1)],))
+
+
+@pytest.fixture
+def queue(dsn):
+    """Committed staff and open tickets (the claimers use their own connections); dropped afterwards."""
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        _cleanup(cursor)
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"CREATE TABLE {SCHEMA}.tickets (LIKE public.tickets INCLUDING ALL)")
+        cursor.execute("""
+            INSERT INTO "Accounts" (user_id, username, password_hash, role, account_status, email, contact_number)
+            SELECT 'queue' || lpad(g::text, 5, '0'), 'queue_staff_' || g, 'x', 'Staff', 1,
+                   'queue' || g || '@example.com', '0000000000'
+            FROM generate_series(1, %s) g
+        """, (STAFF,))
+        cursor.execute("""
+            INSERT INTO tickets (ticket_id, title, description, type, urgency, reporter_id, assigner_id,
+                                 status, created_date, last_update)
+            SELECT %s + g, 'queue ticket ' || g, 'seeded', %s, (%s::text[])[1 + g %% 4], 'queue00001', NULL,
+                   'Open', now() - make_interval(mins => %s - g), now()
+            FROM generate_series(1, %s) g
+        """, (TICKET_BASE, SPECIALITY, list(URGENCIES), TICKETS, TICKETS))
+        conn.commit()
+        yield {TICKET_BASE + g for g in range(1, TICKETS + 1)}
+    finally:
+        conn.rollback()
+        _cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+def _claimer(n, start, claimed, errors):
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        # SKIP LOCKED must never wait on another claimer's row
+        cursor.execute("SET lock_timeout = '2s'")
+        conn.commit()
+        start.wait()
+        while True:
+            ticket = work_queue.claim_next(cursor, _staff_id(n), f"queue_staff_{n}", [SPECIALITY])
+            if ticket is None:
+                conn.rollback()
+                return
+            conn.commit()
+            claimed.append((ticket["ticket_id"], _staff_id(n)))
+    except Exception as e:
+        errors.append(e)
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def test_concurrent_claims_never_share_or_wait(queue):
+    start = threading.Barrier(STAFF)
+    claimed, errors = [], []
+    threads = [threading.Thread(target=_claimer, args=(n, start, claimed, errors))
+               for n in range(1, STAFF + 1)]
+    began = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    elapsed = time.monotonic() - began
+
+    assert errors == []
+    ticket_ids = [ticket_id for ticket_id, _ in claimed]
+    assert len(ticket_ids) == len(set(ticket_ids)), "a ticket was claimed twice"
+    assert set(ticket_ids) == queue
+    assert elapsed < 20
+
+    conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT ticket_id, assigner_id, status FROM tickets WHERE ticket_id BETWEEN %s AND %s
+        """, (TICKET_BASE, TICKET_BASE + TICKETS))
+        rows = {ticket_id: (assigner_id, status) for ticket_id, assigner_id, status in cursor.fetchall()}
+        assert rows == {ticket_id: (staff_id, "Assigned-in_queue") for ticket_id, staff_id in claimed}
+        cursor.execute("""
+            SELECT COUNT(*) FROM transaction_history
+            WHERE ticket_id BETWEEN %s AND %s AND action_type = 'assign'
+        """, (TICKET_BASE, TICKET_BASE + TICKETS))
+        assert cursor.fetchone()[0] == TICKETS
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+def test_locked_ticket_is_skipped_not_waited_on(queue):
+    holder, other = connect(), connect()
+    holding = holder.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor = other.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cursor.execute("SET lock_timeout = '1s'")
+        first = work_queue.claim_next(holding, _staff_id(1), "queue_staff_1", [SPECIALITY])
+        # holder's transaction stays open, so its row stays locked
+        second = work_queue.claim_next(cursor, _staff_id(2), "queue_staff_2", [SPECIALITY])
+        assert first["ticket_id"] in queue and second["ticket_id"] in queue
+        assert first["ticket_id"] != second["ticket_id"]
+    finally:
+        holder.rollback()
+        other.rollback()
+        holding.close()
+        cursor.close()
+        holder.close()
+        other.close()
+
+
+def test_claims_most_urgent_then_oldest_first(queue):
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        order = []
+        for _ in range(TICKETS):
+            ticket = work_queue.claim_next(cursor, _staff_id(1), "queue_staff_1", [SPECIALITY])
+            if ticket is None:
+                break
+            order.append((URGENCY_RANK[ticket["urgency"]], ticket["ticket_id"]))
+        assert len(order) == TICKETS
+        assert order == sorted(order)
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
@@ -0,0 +1,14 @@
+import os
+
+# -------------------------
+# Connection helper shared by the database tests and their fixtures
+# (see conftest.py for how TEST_DATABASE_URL is set up).
+# -------------------------
+
+TEST_DSN = os.getenv("TEST_DATABASE_URL")
+
+
+def connect(**kwargs):
+    """A new psycopg2 connection to the test database; kwargs go to psycopg2.connect."""
+    import psycopg2
+    return psycopg2.connect(TEST_DSN, **kwargs)
@@ -0,0 +1,121 @@
+import hashlib
+from db_pool import execute_prepared
+
+# -------------------------
+# Ticket detail shared by the user/staff/mod APIs.
+# One statement returns the ticket, reporter and assignee accounts, and the
+# attachment list (json_agg), with dates already in Bangkok time, so a ticket
+# page costs a single round trip. It is prepared server-side only when
+# DB_PREPARED_STATEMENTS is on (see db_pool.execute_prepared). validators() is the cheap
+# pre-check behind the APIs' ETag / Last-Modified handling.
+# -------------------------
+
+STATEMENT = "ticket_detail_v1"
+VALIDATORS_STATEMENT = "ticket_validators_v1"
+
+# $1 = ticket_id, $2 = role, $3 = user_id (visibility is checked in SQL)
+VISIBILITY_SQL = """
+    t.ticket_id = $1
+      AND ($2::text = 'Mod'
+           OR ($2::text = 'User' AND t.reporter_id = $3)
+           OR ($2::text = 'Staff' AND t.assigner_id = $3))
+"""
+
+SQL = f"""
+    SELECT t.ticket_id, t.title, t.description, t.status, t.type, t.urgency,
+           t.client_message, t.dev_message,
+           to_char(t.created_date AT TIME ZONE 'Asia/Bangkok', 'YYYY-MM-DD HH24:MI') AS created_date,
+           to_char(t.last_update AT TIME ZONE 'Asia/Bangkok', 'YYYY-MM-DD HH24:MI') AS last_update,
+           ra.username AS reporter_username,
+           ra.email AS reporter_email,
+           ra.contact_number AS reporter_number,
+           aa.username AS assigner_username,
+           aa.email AS assigner_email,
+           aa.contact_number AS assigner_number,
+           COALESCE((
+               SELECT json_agg(json_build_object(
+                          'filename', ta.filename,
+                          'filetype', ta.mime_type,
+                          'upload_date', to_char(ta.upload_date AT TIME ZONE 'Asia/Bangkok', 'YYYY-MM-DD HH24:MI'),
+                          'storage_status', ta.storage_status
+                      ) ORDER BY ta.upload_date DESC)
+               FROM ticket_attachments ta
+               WHERE ta.ticket_id = t.ticket_id
+           ), '[]'::json) AS attachments
+    FROM tickets t
+    JOIN "Accounts" ra ON t.reporter_id = ra.user_id
+    LEFT JOIN "Accounts" aa ON t.assigner_id = aa.user_id
+    WHERE {VISIBILITY_SQL}
+"""
+
+# Just what the cache validators are derived from: no account joins, no json_agg
+VALIDATORS_SQL = f"""
+    SELECT t.last_update, a.attachment_count, a.unsettled_count
+    FROM tickets t
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS attachment_count,
+               COUNT(*) FILTER (WHERE ta.storage_status <> 'stored') AS unsettled_count
+        FROM ticket_attachments ta
+        WHERE ta.ticket_id = t.ticket_id
+    ) a
+    WHERE {VISIBILITY_SQL}
+"""
+
+ROLES = ("User", "Staff", "Mod")
+
+
+def fetch(conn, cursor, ticket_id, role, user_id):
+    """The detail row for ticket_id if (role, user_id) may see it, else None."""
+    if role not in ROLES:
+        raise ValueError(f"No ticket visibility rule for role {role!r}")
+    execute_prepared(conn, cursor, STATEMENT, SQL, (ticket_id, role, user_id))
+    return cursor.fetchone()
+
+
+def validators(conn, cursor, ticket_id, role, user_id):
+    """
+    (etag, last_modified) for the detail payload of ticket_id as seen by
+    (role, user_id), or None if it is not visible. Every ticket edit bumps
+    last_update; the attachment counts cover uploads and storage moves.
+    """
+    if role not in ROLES:
+        raise ValueError(f"No ticket visibility rule for role {role!r}")
+    execute_prepared(conn, cursor, VALIDATORS_STATEMENT, VALIDATORS_SQL, (ticket_id, role, user_id))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    last_update = row["last_update"]
+    stamp = last_update.isoformat() if last_update else ""
+    key = f"{role}:{ticket_id}:{stamp}:{row['attachment_count']}:{row['unsettled_count']}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20], last_update
+
+
+def to_response(row, role):
+    """API payload for one role; keys match what each dashboard already reads."""
+    data = {
+        "id": row["ticket_id"],
+        "title": row["title"],
+        "description": row["description"],
+        "status": row["status"],
+        "type": row["type"],
+        "urgency": row["urgency"],
+        "created_date": row["created_date"],
+        "last_update": row["last_update"],
+    }
+    if role != "User":
+        data.update({
+            "reporter_username": row["reporter_username"],
+            "user_email": row["reporter_email"],
+            "user_number": row["reporter_number"],
+        })
+    if role != "Staff":
+        data.update({
+            "assigner_username": row["assigner_username"],
+            "staff_email": row["assigner_email"],
+            "staff_number": row["assigner_number"],
+        })
+    data["client_messages"] = row["client_message"]
+    if role != "User":
+        data["dev_messages"] = row["dev_message"]
+    data["attachments"] = row["attachments"]
+    return data
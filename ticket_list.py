@@ -0,0 +1,141 @@
+import base64
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from query_args import BadQuery, int_arg, time_arg
+
+# -------------------------
+# Server-side ticket listing shared by the user/staff/mod dashboards.
+# Filtering, sorting and keyset paging all happen in SQL, so the cost of a
+# dashboard page depends on the page size, not on the size of `tickets`.
+# -------------------------
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Sort keys the client may ask for -> column. ticket_id is always the tie-breaker.
+SORT_KEYS = {
+    "created_date": "t.created_date",
+    "last_update": "t.last_update",
+    "ticket_id": "t.ticket_id",
+}
+
+
+def _visibility(role, user_id):
+    """Role visibility rules, as a WHERE fragment + params."""
+    if role == "User":
+        return ["t.reporter_id = %s"], [user_id]
+    if role == "Staff":
+        return ["t.assigner_id = %s", "t.status NOT IN ('Closed')"], [user_id]
+    if role == "Mod":
+        return [], []
+    raise ValueError(f"No ticket visibility rule for role {role!r}")
+
+
+def _encode_cursor(row, sort):
+    value = row[sort]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row["ticket_id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(token):
+    try:
+        value, ticket_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception:
+        raise BadQuery("'cursor' is invalid")
+    return value, ticket_id
+
+
+def build_query(args, role, user_id):
+    """
+    The page query for fetch_page: (sql, params, sort, limit).
+    The query fetches limit + 1 rows, to know whether another page exists.
+    """
+    sort = args.get("sort") or "created_date"
+    if sort not in SORT_KEYS:
+        raise BadQuery(f"'sort' must be one of: {', '.join(SORT_KEYS)}")
+    order = (args.get("order") or "desc").lower()
+    if order not in ("asc", "desc"):
+        raise BadQuery("'order' must be 'asc' or 'desc'")
+    limit = int_arg(args, "limit") or DEFAULT_PAGE_SIZE
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    where, params = _visibility(role, user_id)
+
+    for name in ("status", "type", "urgency"):
+        if args.get(name):
+            where.append(f"t.{name} = %s")
+            params.append(args.get(name))
+    if args.get("ticket_id"):
+        # Prefix match, so the ID box can filter while the user types
+        where.append("t.ticket_id::text LIKE %s")
+        params.append(f"{args.get('ticket_id')}%")
+    if args.get("title"):
+        where.append("t.title ILIKE %s")
+        params.append(f"%{args.get('title')}%")
+
+    for arg, column, op in (("created_from", "t.created_date", ">="),
+                            ("created_to", "t.created_date", "<"),
+                            ("updated_from", "t.last_update", ">="),
+                            ("updated_to", "t.last_update", "<")):
+        value = time_arg(args, arg)
+        if value is not None:
+            where.append(f"{column} {op} %s")
+            params.append(value)
+
+    column = SORT_KEYS[sort]
+    if args.get("cursor"):
+        value, ticket_id = _decode_cursor(args.get("cursor"))
+        cmp = "<" if order == "desc" else ">"
+        if sort == "ticket_id":
+            where.append(f"t.ticket_id {cmp} %s")
+            params.append(ticket_id)
+        else:
+            where.append(f"({column}, t.ticket_id) {cmp} (%s, %s)")
+            params.extend([value, ticket_id])
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    direction = "DESC" if order == "desc" else "ASC"
+    order_sql = f"t.ticket_id {direction}" if sort == "ticket_id" else f"{column} {direction}, t.ticket_id {direction}"
+
+    params.append(limit + 1)
+    sql = f"""
+        SELECT
+            t.ticket_id, t.title, t.description, t.status,
+            t.created_date, t.last_update,
+            t.type, t.urgency
+        FROM tickets t
+        {where_sql}
+        ORDER BY {order_sql}
+        LIMIT %s
+    """
+    return sql, params, sort, limit
+
+
+def fetch_page(cursor, args, role, user_id):
+    """
+    One page of tickets visible to (role, user_id).
+    args is request.args (or a plain dict); supported keys: status, type,
+    urgency, ticket_id, title, created_from, created_to, updated_from,
+    updated_to, sort, order, limit, cursor.
+    Returns {"tickets": [...], "next_cursor": str | None}.
+    """
+    sql, params, sort, limit = build_query(args, role, user_id)
+    cursor.execute(sql, params)
+    tickets = cursor.fetchall()
+
+    next_cursor = None
+    if len(tickets) > limit:
+        tickets = tickets[:limit]
+        next_cursor = _encode_cursor(tickets[-1], sort)
+
+    bangkok = ZoneInfo("Asia/Bangkok")
+    for t in tickets:
+        if t["created_date"]:
+            t["created_date"] = t["created_date"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
+        if t["last_update"]:
+            t["last_update"] = t["last_update"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
+
+    return {"tickets": tickets, "next_cursor": next_cursor}
@@ -0,0 +1,111 @@
+from zoneinfo import ZoneInfo
+import bulk_write
+from query_args import BadQuery, int_arg, time_arg
+
+# -------------------------
+# Keyset-paginated transaction history, shared by the mod/staff/admin APIs.
+# Pages walk transaction_id downwards, so each page is an index range scan
+# no matter how large transaction_history grows.
+# record() writes any number of history rows in one statement.
+# -------------------------
+
+COLUMNS = ("ticket_id", "action_type", "action_by", "action_time", "detail")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def build_query(args):
+    """
+    The page query for fetch_page: (sql, params, limit).
+    The query fetches limit + 1 rows, to know whether another page exists.
+    """
+    limit = int_arg(args, "limit") or DEFAULT_PAGE_SIZE
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = int_arg(args, "cursor")
+
+    where = []
+    params = []
+    if after is not None:
+        where.append("th.transaction_id < %s")
+        params.append(after)
+    transaction_id = int_arg(args, "transaction_id")
+    if transaction_id is not None:
+        where.append("th.transaction_id = %s")
+        params.append(transaction_id)
+    ticket_id = int_arg(args, "ticket_id")
+    if ticket_id is not None:
+        where.append("th.ticket_id = %s")
+        params.append(ticket_id)
+    if args.get("action_type"):
+        where.append("th.action_type = %s")
+        params.append(args.get("action_type"))
+    action_by = (args.get("action_by") or "").strip()
+    if action_by:
+        # A user ID or a username; either way an equality on th.action_by
+        where.append("""th.action_by IN (SELECT %s UNION ALL
+                                         SELECT user_id FROM "Accounts" WHERE username = %s)""")
+        params.extend([action_by, action_by])
+    detail = (args.get("detail") or "").strip()
+    if detail:
+        where.append("th.detail ILIKE %s")
+        params.append("%" + detail.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    since = time_arg(args, "since")
+    if since is not None:
+        where.append("th.action_time >= %s")
+        params.append(since)
+    until = time_arg(args, "until")
+    if until is not None:
+        where.append("th.action_time < %s")
+        params.append(until)
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    params.append(limit + 1)
+    sql = f"""
+        SELECT th.transaction_id,
+               th.ticket_id,
+               th.action_type,
+               th.action_by      AS action_by_id,
+               a.username        AS action_by_username,
+               th.action_time,
+               th.detail
+        FROM transaction_history th
+        LEFT JOIN "Accounts" a ON th.action_by = a.user_id
+        {where_sql}
+        ORDER BY th.transaction_id DESC
+        LIMIT %s
+    """
+    return sql, params, limit
+
+
+def fetch_page(cursor, args):
+    """
+    Run one page of the history query.
+    args is request.args; supported keys: cursor, limit, transaction_id,
+    ticket_id, action_type, action_by (user ID or username), detail
+    (case-insensitive substring), since, until.
+    Returns {"transactions": [...], "next_cursor": int | None}.
+    """
+    sql, params, limit = build_query(args)
+    cursor.execute(sql, params)
+    transactions = cursor.fetchall()
+
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = transactions[-1]["transaction_id"]
+
+    bangkok = ZoneInfo("Asia/Bangkok")
+    for t in transactions:
+        if t["action_time"]:
+            t["action_time"] = t["action_time"].astimezone(bangkok).strftime("%Y-%m-%d %H:%M")
+
+    return {"transactions": transactions, "next_cursor": next_cursor}
+
+
+def record(cursor, *entries):
+    """
+    Insert history rows, each a (ticket_id, action_type, action_by,
+    action_time, detail) tuple, in a single statement.
+    """
+    bulk_write.insert_many(cursor, "transaction_history", COLUMNS, entries)
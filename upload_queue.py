@@ -0,0 +1,352 @@
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import psycopg2
+import psycopg2.extras
+import bulk_write
+import storage_gateway
+from db_pool import get_db_connection
+
+# -------------------------
+# Deferred (background) uploads of large attachments.
+# With DEFERRED_UPLOADS=1 a request only keeps the spooled file on local disk,
+# inserts its ticket_attachments row as 'pending' plus an
+# attachment_upload_queue row, and returns. Worker threads pick queue rows up,
+# upload them, and flip the attachment to 'stored'; failed uploads are retried
+# with exponential backoff and end up inline (bytea) after MAX_ATTEMPTS.
+# The queue table is the source of truth, so nothing is lost on restart as
+# long as the spool directory survives.
+# Rows that were stored inline because storage was down carry
+# storage_status = 'fallback'; migrate_fallbacks() moves them to storage later.
+# -------------------------
+
+DEFERRED_UPLOADS = os.getenv("DEFERRED_UPLOADS", "0") == "1"
+SPOOL_DIR = os.getenv("UPLOAD_QUEUE_DIR", os.path.join(tempfile.gettempdir(), "upload_queue"))
+WORKERS = int(os.getenv("UPLOAD_QUEUE_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("UPLOAD_QUEUE_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE = float(os.getenv("UPLOAD_QUEUE_BACKOFF_BASE", "2"))    # seconds before the first retry
+BACKOFF_MAX = float(os.getenv("UPLOAD_QUEUE_BACKOFF_MAX", "300"))
+POLL_INTERVAL = float(os.getenv("UPLOAD_QUEUE_POLL_INTERVAL", "1"))
+LEASE_SECONDS = int(os.getenv("UPLOAD_QUEUE_LEASE", "300"))          # claimed rows are retried after this
+ORPHAN_AGE = float(os.getenv("UPLOAD_QUEUE_ORPHAN_AGE", "3600"))     # spool files with no queue row
+INLINE_CHUNK_SIZE = 1 * 1024 * 1024
+
+# params: (lease_seconds, spool_host)
+CLAIM_SQL = """
+    UPDATE attachment_upload_queue q
+    SET attempts = q.attempts + 1,
+        next_attempt_at = now() + make_interval(secs => %s)
+    WHERE q.attachment_id = (
+        SELECT attachment_id FROM attachment_upload_queue
+        WHERE spool_host = %s AND next_attempt_at <= now()
+        ORDER BY next_attempt_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING q.attachment_id, q.spool_path, q.storage_path, q.mime_type, q.attempts
+"""
+
+# params: (limit,)
+FALLBACKS_SQL = """
+    SELECT id, ticket_id, filename, mime_type, octet_length(filedata) AS filesize
+    FROM ticket_attachments
+    WHERE storage_status = 'fallback'
+    ORDER BY id
+    LIMIT %s
+"""
+
+
+def backoff_delay(attempts, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Seconds to wait after the given number of failed attempts (with jitter)."""
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class UploadQueue:
+    def __init__(self, storage=storage_gateway, connect=get_db_connection, spool_dir=SPOOL_DIR,
+                 workers=WORKERS, max_attempts=MAX_ATTEMPTS, poll_interval=POLL_INTERVAL):
+        self.storage = storage
+        self.connect = connect
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.host = socket.gethostname()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._counters = {
+            "enqueued": 0,
+            "stored": 0,
+            "retries": 0,
+            "inlined": 0,
+            "missing": 0,
+        }
+
+    def _count(self, name):
+        with self._cond:
+            self._counters[name] += 1
+
+    # ---- request side ----
+    def enqueue(self, cursor, attachment_id, upload, storage_path):
+        """
+        Keep a spooled upload for the workers; runs inside the request's transaction.
+        The attachment row must already exist with storage_status = 'pending'.
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        spool_path = upload.keep(os.path.join(self.spool_dir, f"{attachment_id}_{uuid.uuid4().hex}"))
+        cursor.execute("""
+            INSERT INTO attachment_upload_queue (attachment_id, spool_host, spool_path, storage_path, mime_type)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (attachment_id, self.host, spool_path, storage_path, upload.mimetype))
+        self._count("enqueued")
+        self.wake()
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    # ---- worker side ----
+    def _claim(self):
+        """Lease the next due job on this host, or return None."""
+        conn = self.connect()
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        try:
+            cursor.execute(CLAIM_SQL, (LEASE_SECONDS, self.host))
+            job = cursor.fetchone()
+            conn.commit()
+            return job
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _finish(self, job, sql, params, remove_spool):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            cursor.execute("DELETE FROM attachment_upload_queue WHERE attachment_id = %s",
+                           (job["attachment_id"],))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        if remove_spool:
+            try:
+                os.remove(job["spool_path"])
+            except OSError:
+                pass
+
+    def _store_inline(self, job):
+        """Give up on storage: write the spooled file into the row as bytea."""
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            with open(job["spool_path"], "rb") as f:
+                bulk_write.write_blob(cursor, "ticket_attachments", "filedata", job["attachment_id"], f,
+                                      INLINE_CHUNK_SIZE)
+            cursor.execute("UPDATE ticket_attachments SET storage_status = 'fallback' WHERE id = %s",
+                           (job["attachment_id"],))
+            cursor.execute("DELETE FROM attachment_upload_queue WHERE attachment_id = %s",
+                           (job["attachment_id"],))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        os.remove(job["spool_path"])
+        self._count("inlined")
+
+    def _retry_later(self, job, error, delay=None, refund=False):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE attachment_upload_queue
+                SET last_error = %s, next_attempt_at = now() + make_interval(secs => %s),
+                    attempts = attempts - %s
+                WHERE attachment_id = %s
+            """, (error, backoff_delay(job["attempts"]) if delay is None else delay,
+                  1 if refund else 0, job["attachment_id"]))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        self._count("retries")
+
+    def process(self, job):
+        """Upload one claimed job and record the outcome."""
+        if not os.path.exists(job["spool_path"]):
+            print(f"Deferred upload {job['attachment_id']}: spool file is gone")
+            self._finish(job, "UPDATE ticket_attachments SET storage_status = 'failed' WHERE id = %s",
+                         (job["attachment_id"],), remove_spool=False)
+            self._count("missing")
+            return
+        try:
+            with open(job["spool_path"], "rb") as f:
+                file_url = self.storage.upload(job["storage_path"], f, content_type=job["mime_type"])
+        except storage_gateway.StorageUnavailable as e:
+            # Not a real attempt: wait for the breaker's next probe window
+            self._retry_later(job, str(e), delay=max(storage_gateway.breaker.retry_in(), self.poll_interval),
+                              refund=True)
+            return
+        except Exception as e:
+            print(f"Deferred upload {job['attachment_id']} failed (attempt {job['attempts']}): {e}")
+            if job["attempts"] >= self.max_attempts:
+                self._store_inline(job)
+            else:
+                self._retry_later(job, str(e))
+            return
+        self._finish(job, """
+            UPDATE ticket_attachments SET file_url = %s, storage_status = 'stored' WHERE id = %s
+        """, (file_url, job["attachment_id"]), remove_spool=True)
+        self._count("stored")
+
+    def run_once(self):
+        """Claim and process one due job; returns False when nothing was due."""
+        job = self._claim()
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"Upload queue worker error: {e}")
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait(self.poll_interval)
+
+    def sweep_orphans(self):
+        """Delete spool files whose request was rolled back (no queue row)."""
+        if not os.path.isdir(self.spool_dir):
+            return 0
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT spool_path FROM attachment_upload_queue WHERE spool_host = %s",
+                           (self.host,))
+            known = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        removed = 0
+        cutoff = time.time() - ORPHAN_AGE
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            if path not in known and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"upload-queue-{i}", daemon=True)
+                self._threads.append(t)
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for t in threads:
+            t.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._counters)
+            data["workers"] = len(self._threads)
+        return data
+
+
+queue = UploadQueue()
+
+
+def migrate_fallbacks(storage=storage_gateway, connect=get_db_connection, limit=50):
+    """
+    Move attachments that were stored inline during a storage outage
+    (storage_status = 'fallback') to storage, one row per transaction.
+    Returns the number of rows moved; stops early while storage is unavailable.
+    """
+    conn = connect()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    moved = 0
+    try:
+        cursor.execute(FALLBACKS_SQL, (limit,))
+        rows = cursor.fetchall()
+        conn.commit()
+
+        for row in rows:
+            # The storage client takes bytes or a file from open(path, "rb"), so the
+            # blob is copied to a named temp file slice by slice and read back from it
+            fd, spool_path = tempfile.mkstemp(prefix="fallback_")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    for offset in range(1, (row["filesize"] or 0) + 1, INLINE_CHUNK_SIZE):
+                        cursor.execute(
+                            "SELECT substring(filedata FROM %s FOR %s) AS part FROM ticket_attachments WHERE id = %s",
+                            (offset, INLINE_CHUNK_SIZE, row["id"]))
+                        out.write(cursor.fetchone()["part"])
+                conn.commit()
+                storage_path = storage_gateway.storage_path_for(row["ticket_id"], row["filename"])
+                with open(spool_path, "rb") as f:
+                    file_url = storage.upload(storage_path, f, content_type=row["mime_type"])
+            except storage_gateway.StorageError as e:
+                print(f"Fallback migration of attachment {row['id']} failed: {e}")
+                if isinstance(e, storage_gateway.StorageUnavailable):
+                    break
+                continue
+            finally:
+                os.remove(spool_path)
+            cursor.execute("""
+                UPDATE ticket_attachments
+                SET file_url = %s, filedata = NULL, storage_status = 'stored'
+                WHERE id = %s AND storage_status = 'fallback'
+            """, (file_url, row["id"]))
+            conn.commit()
+            moved += 1
+        return moved
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def init_app(app):
+    """In deferred mode, start the workers (schema: migrations/0001)."""
+    if DEFERRED_UPLOADS:
+        try:
+            queue.sweep_orphans()
+        except Exception as e:
+            print(f"Upload queue sweep failed: {e}")
+        queue.start()
+
+
+if __name__ == '__main__':
+    # Run from cron / by hand once storage is healthy again
+    print(f"Moved {migrate_fallbacks()} fallback attachments to storage")
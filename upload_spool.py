@@ -0,0 +1,113 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+# -------------------------
+# Chunked ingestion of uploaded files.
+# The upload stream is copied in CHUNK_SIZE pieces; small files stay in a
+# memory buffer, anything past the inline threshold is moved to a temp file
+# on disk. Size and SHA-256 are computed on the way through.
+# -------------------------
+
+CHUNK_SIZE = 64 * 1024
+
+
+class SpooledUpload:
+    def __init__(self, filename, mimetype, threshold):
+        self.filename = filename
+        self.mimetype = mimetype
+        self.threshold = threshold
+        self.size = 0
+        self.sha256 = None
+        self.path = None            # set once the file has spilled to disk
+        self._buffer = io.BytesIO()
+        self._disk = None
+        self._kept = False          # path was handed over by keep(); close() leaves it
+
+    def _write(self, chunk):
+        self.size += len(chunk)
+        if self._disk is None and self.size > self.threshold:
+            self._disk = tempfile.NamedTemporaryFile(prefix="upload_", delete=False)
+            self.path = self._disk.name
+            self._disk.write(self._buffer.getbuffer())
+            self._buffer = None
+        if self._disk is not None:
+            self._disk.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    @property
+    def inline(self):
+        return self.path is None
+
+    def data(self):
+        """Bytes of a small (in-memory) upload."""
+        if not self.inline:
+            raise ValueError("Upload is on disk; stream it with open() / chunks()")
+        return self._buffer.getvalue()
+
+    def open(self):
+        """Binary file object positioned at the start."""
+        if self.inline:
+            return io.BytesIO(self._buffer.getvalue())
+        return open(self.path, "rb")
+
+    def chunks(self, size=CHUNK_SIZE):
+        with self.open() as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def keep(self, dest):
+        """Move an on-disk upload to dest; close() will then leave it alone."""
+        if self.inline:
+            raise ValueError("Only uploads spilled to disk can be kept")
+        # shutil.move copies when dest is on another filesystem (os.replace raises EXDEV)
+        shutil.move(self.path, dest)
+        self.path = dest
+        self._kept = True
+        return dest
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+        if self.path is not None and not self._kept:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def spool(file, threshold):
+    """Copy a werkzeug FileStorage into a SpooledUpload, chunk by chunk."""
+    upload = SpooledUpload(file.filename, file.mimetype, threshold)
+    digest = hashlib.sha256()
+    try:
+        while True:
+            chunk = file.stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            upload._write(chunk)
+        if upload._disk is not None:
+            upload._disk.flush()
+            upload._disk.close()
+            upload._disk = None
+    except Exception:
+        upload.close()
+        raise
+    upload.sha256 = digest.hexdigest()
+    return upload
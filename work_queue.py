@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+import auto_assign
+import transaction_history
+
+# -------------------------
+# Pull-based work queue for staff ("claim next ticket").
+# The next open, unassigned ticket matching the caller's specialities (or of
+# type Other) is picked most urgent / oldest first and locked with
+# FOR UPDATE SKIP LOCKED: concurrent claimers step over each other's rows
+# instead of waiting on them, and a row can only be claimed once.
+# -------------------------
+
+
+# params: (specialities,)
+CLAIM_SQL = f"""
+    SELECT t.ticket_id, t.title, t.type, t.urgency
+    FROM tickets t
+    WHERE t.status = 'Open' AND t.assigner_id IS NULL
+      AND (t.type = ANY(%s::text[]) OR t.type IS NULL OR lower(t.type) = 'other')
+    ORDER BY {auto_assign.URGENCY_RANK_SQL}, t.created_date, t.ticket_id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+"""
+
+
+def claim_next(cursor, staff_id, staff_username, specialities):
+    """
+    Assign the next matching ticket to staff_id on the caller's transaction
+    (the caller commits). Returns the claimed ticket row, or None if the
+    queue holds nothing for this staff member.
+    """
+    cursor.execute(CLAIM_SQL, (list(specialities),))
+    ticket = cursor.fetchone()
+    if ticket is None:
+        return None
+
+    now = datetime.now(timezone.utc)
+    cursor.execute("""
+        UPDATE tickets
+        SET status = 'Assigned-in_queue', assigner_id = %s, last_update = %s
+        WHERE ticket_id = %s
+    """, (staff_id, now, ticket["ticket_id"]))
+    transaction_history.record(cursor, (ticket["ticket_id"], 'assign', staff_id, now,
+                                        f'Ticket claimed by staff: {staff_username} (ID: {staff_id})'))
+    return ticket